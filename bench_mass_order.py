@@ -0,0 +1,145 @@
+import os
+import sys
+import time
+import asyncio
+import argparse
+
+os.environ.setdefault("SUPABASE_URL", "http://bench.invalid")
+os.environ.setdefault("SUPABASE_KEY", "bench")
+os.environ.pop("DATABASE_URL", None)
+
+import db
+import handlers
+from catalog import catalog
+
+# 📏 MASS ORDER BENCHMARK
+# Drives the real /massorder path (mass_preview -> parse_mass_lines, catalog.get_many;
+# mass_confirm -> ledger.debit, insert_chunked) against a stub Supabase client that
+# sleeps a fixed RTT per request, so round trips and latency per line count can be
+# measured without touching the live database.
+
+class StubResult:
+    def __init__(self, data):
+        self.data = data
+
+class StubQuery:
+    def __init__(self, client, table):
+        self.client = client
+        self.table = table
+        self.filters = []
+        self.rows = None
+        self.span = None
+
+    def select(self, *a, **kw): return self
+    def order(self, *a, **kw): return self
+    def limit(self, *a, **kw): return self
+
+    def eq(self, col, val):
+        self.filters.append((col, {str(val)})); return self
+
+    def in_(self, col, vals):
+        self.filters.append((col, {str(v) for v in vals})); return self
+
+    def range(self, start, end):
+        self.span = (start, end); return self
+
+    def insert(self, rows):
+        self.rows = rows if isinstance(rows, list) else [rows]; return self
+
+    def execute(self):
+        return self.client.round_trip(self)
+
+class StubRpc:
+    def __init__(self, client, name, params):
+        self.client = client
+        self.name = name
+        self.params = params
+
+    def execute(self):
+        return self.client.round_trip(self)
+
+class StubClient:
+    def __init__(self, rtt_ms, services):
+        self.rtt = rtt_ms / 1000.0
+        self.calls = 0
+        self.tables = {"services": services, "users": [USER], "WebsiteOrders": []}
+
+    def table(self, name): return StubQuery(self, name)
+    def rpc(self, name, params): return StubRpc(self, name, params)
+
+    def round_trip(self, q):
+        self.calls += 1
+        time.sleep(self.rtt)
+        if isinstance(q, StubRpc): return StubResult(1e9)  # ledger_debit/credit: new balance
+        rows = self.tables.setdefault(q.table, [])
+        if q.rows is not None:
+            for r in q.rows: r = dict(r, id=len(rows) + 1); rows.append(r)
+            return StubResult(rows[-len(q.rows):])
+        out = [r for r in rows if all(str(r.get(c)) in vals for c, vals in q.filters)]
+        if q.span: out = out[q.span[0]:q.span[1] + 1]
+        return StubResult(out)
+
+USER = {"id": 1, "telegram_id": 1, "email": "bench@example.com", "balance_usd": 1e9, "currency": "USD", "language": "en"}
+
+class FakeMessage:
+    async def reply_text(self, *a, **kw): pass
+
+class FakeQuery:
+    def __init__(self, data):
+        self.data = data
+        self.message = FakeMessage()
+    async def answer(self, *a, **kw): pass
+    async def edit_message_text(self, *a, **kw): pass
+
+class FakeUser:
+    id = 1
+
+class FakeUpdate:
+    def __init__(self, data=None):
+        self.effective_user = FakeUser()
+        self.message = FakeMessage()
+        self.callback_query = FakeQuery(data) if data else None
+
+class FakeContext:
+    def __init__(self):
+        self.user_data = {}
+
+def install(client):
+    # Every module holds its own `from db import supabase` reference
+    real = db.supabase
+    for mod in list(sys.modules.values()):
+        if getattr(mod, "supabase", None) is real: mod.supabase = client
+
+def make_services(n):
+    return [{"id": i, "service_id": 10000 + i, "service_name": f"Service {i}", "min": 10, "max": 100000,
+             "per_quantity": 1000, "sell_price": 1.5, "buy_price": 1.0, "source": "smmgen", "use_type": "Default"}
+            for i in range(1, n + 1)]
+
+async def run(client, n_lines, n_services, warm):
+    lines = [f"{(i % n_services) + 1} https://t.me/bench/{i} {100 + i}" for i in range(n_lines)]
+    if not warm: catalog.invalidate()
+    else: catalog.all()
+    ctx = FakeContext()
+    client.calls = 0; started = time.perf_counter()
+    await handlers.mass_preview(FakeUpdate(), ctx, lines)
+    preview = (client.calls, (time.perf_counter() - started) * 1000)
+    client.calls = 0; started = time.perf_counter()
+    await handlers.mass_confirm(FakeUpdate("mass_yes"), ctx)
+    confirm = (client.calls, (time.perf_counter() - started) * 1000)
+    return len(ctx.user_data.get("mass_queue", [])), preview, confirm
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rtt", type=float, default=40.0, help="simulated round trip in ms")
+    ap.add_argument("--services", type=int, default=3000, help="catalog size")
+    ap.add_argument("--lines", default="10,50,200,1000")
+    ap.add_argument("--warm", action="store_true", help="catalog already cached (skip the refresh pages)")
+    ARGS = ap.parse_args()
+
+    client = StubClient(ARGS.rtt, make_services(ARGS.services))
+    install(client)
+    print(f"RTT {ARGS.rtt:.0f}ms | {ARGS.services} services | catalog {'warm' if ARGS.warm else 'cold'}")
+    print(f"{'lines':>6} {'valid':>6} | {'preview trips':>13} {'ms':>7} | {'confirm trips':>13} {'ms':>7}")
+    for n in [int(x) for x in ARGS.lines.split(",")]:
+        valid, (p_calls, p_ms), (c_calls, c_ms) = asyncio.run(run(client, n, ARGS.services, ARGS.warm))
+        print(f"{n:>6} {valid:>6} | {p_calls:>13} {p_ms:>7.0f} | {c_calls:>13} {c_ms:>7.0f}")
@@ -1,35 +1,71 @@
 import os
+import signal
 import threading
-import requests
-import time
+import asyncio
 from telegram.ext import ApplicationBuilder, ConversationHandler, CommandHandler, MessageHandler, CallbackQueryHandler, filters
 import config
 from flask import Flask
 import handlers
 import jobs
+from outbox import outbox
+from changefeed import change_feed
+from scheduler import scheduler
+from leases import leases, order_shards, status_shards
 
 app = Flask(__name__)
 @app.route('/')
 def home(): return "Bot is running!", 200
 def run_flask(): app.run(host="0.0.0.0", port=int(os.environ.get("PORT", 5000)))
 
-def send_startup_alert():
-    time.sleep(2)
-    msg = "🚀 **Bot Online!**"
-    try: requests.post(f"https://api.telegram.org/bot{config.BOT_TOKEN}/sendMessage", json={"chat_id": config.REPORT_GROUP_ID, "text": msg, "parse_mode": "Markdown"})
-    except: pass
+async def on_startup(application):
+    change_feed.start()
+    jobs.register_jobs(scheduler)
+    await scheduler.start()
+    outbox.send(config.REPORT_GROUP_ID, "🚀 **Bot Online!**", parse_mode="Markdown")
+
+async def on_shutdown(application):
+    await scheduler.stop()
+    # Let claimed submits finish (they're journaled either way), then drain queued notifications
+    await asyncio.to_thread(jobs.SUBMIT_POOL.shutdown, wait=True, cancel_futures=True)
+    # Hand our shards back now instead of making the other replicas wait out the lease TTL
+    for shards in (order_shards, status_shards): await asyncio.to_thread(shards.release_all)
+    await asyncio.to_thread(outbox.flush, 5)
+
+async def run_replica(application):
+    # Several replicas: only the holder of the "telegram-updates" lease polls getUpdates (two
+    # pollers on one token get 409 Conflict, and conversation state is per process). The
+    # others run their jobs and take over once the lease expires.
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM): loop.add_signal_handler(sig, stop.set)
+    async with application:
+        await on_startup(application)
+        await application.start()
+        try:
+            while not stop.is_set():
+                try: leader = await asyncio.to_thread(leases.acquire, "telegram-updates", config.LEASE_TTL)
+                except Exception as e:
+                    print(f"⚠️ Updates lease check failed: {e}"); leader = application.updater.running
+                if leader and not application.updater.running:
+                    print("👑 Polling Telegram updates"); await application.updater.start_polling()
+                elif not leader and application.updater.running:
+                    print("👑 Updates lease lost, standing by"); await application.updater.stop()
+                try: await asyncio.wait_for(stop.wait(), config.LEASE_TTL / 3)
+                except asyncio.TimeoutError: pass
+        finally:
+            if application.updater.running: await application.updater.stop()
+            try: await asyncio.to_thread(leases.release, "telegram-updates")
+            except Exception as e: print(f"⚠️ Updates lease release failed: {e}")
+            await application.stop()
+            await on_shutdown(application)
 
 if __name__ == '__main__':
+    try: jobs.replay_submit_journal()
+    except Exception as e: print(f"⚠️ Journal replay failed: {e}")
     threading.Thread(target=run_flask, daemon=True).start()
-    threading.Thread(target=jobs.poll_transactions, daemon=True).start()
-    threading.Thread(target=jobs.poll_affiliate, daemon=True).start()
-    threading.Thread(target=jobs.check_smmgen_rates_loop, daemon=True).start()
-    threading.Thread(target=jobs.process_pending_orders_loop, daemon=True).start()
-    threading.Thread(target=jobs.smmgen_status_batch_loop, daemon=True).start()
-    threading.Thread(target=jobs.poll_supportbox_worker, daemon=True).start()
-    threading.Thread(target=send_startup_alert, daemon=True).start()
 
-    app = ApplicationBuilder().token(config.BOT_TOKEN).build()
+    # Background jobs run on the bot's event loop (scheduler.py), started/stopped with the app
+    app = ApplicationBuilder().token(config.BOT_TOKEN).post_init(on_startup).post_shutdown(on_shutdown).build()
 
     # Handlers
     login_h = ConversationHandler(
@@ -70,6 +106,7 @@ if __name__ == '__main__':
         states={
             config.WAITING_MASS_INPUT: [
                 MessageHandler(filters.TEXT, handlers.mass_process),
+                MessageHandler(filters.Document.FileExtension("txt") | filters.Document.FileExtension("csv"), handlers.mass_file),
                 CallbackQueryHandler(handlers.cancel_callback, pattern='^no$')
             ],
             config.WAITING_MASS_CONFIRM: [CallbackQueryHandler(handlers.mass_confirm)]
@@ -120,11 +157,15 @@ if __name__ == '__main__':
     app.add_handler(CommandHandler('Topup', handlers.admin_manual_topup))
     app.add_handler(CommandHandler('Done', handlers.admin_order_done))
     app.add_handler(CommandHandler('Error', handlers.admin_order_error))
+    app.add_handler(CommandHandler('Resend', handlers.admin_order_resend))
     app.add_handler(CommandHandler('Answer', handlers.admin_answer_ticket))
     app.add_handler(CommandHandler('Close', handlers.admin_ticket_close))
     app.add_handler(CommandHandler('add', handlers.admin_add_bulk))
+    app.add_handler(CommandHandler('stats', handlers.admin_stats))
+    app.add_handler(CommandHandler('reprice', handlers.admin_reprice))
     
     print("Bot Running...")
-    app.run_polling()
+    if config.REPLICA_COUNT > 1: asyncio.run(run_replica(app))
+    else: app.run_polling()
 
 
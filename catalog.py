@@ -0,0 +1,75 @@
+import time
+import threading
+import config
+from db import supabase, chunked, fetch_all
+
+# 📚 SERVICE CATALOG CACHE (process-wide, TTL refresh, invalidated on local writes)
+class ServiceCatalog:
+    PAGE = 1000
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl if ttl is not None else config.CATALOG_TTL
+        self._lock = threading.Lock()
+        self._loaded_at = 0.0
+        self._rows = []
+        self._by_id = {}
+        self._by_service_id = {}
+        self._by_name = {}
+
+    def refresh(self, max_age=None):
+        with self._lock:
+            # Threads that queued behind a refresh find it already done
+            if max_age is not None and time.monotonic() - self._loaded_at < max_age: return
+            rows = fetch_all(lambda: supabase.table("services").select("*").order("id"), self.PAGE)
+            self._by_id = {str(r["id"]): r for r in rows}
+            self._by_service_id = {str(r.get("service_id")): r for r in rows if r.get("service_id") is not None}
+            self._by_name = {}
+            for r in rows: self._by_name.setdefault(r.get("service_name"), r)
+            self._rows = rows
+            self._loaded_at = time.monotonic()
+
+    def _ensure(self):
+        if time.monotonic() - self._loaded_at < self.ttl: return
+        try: self.refresh(self.ttl)
+        except Exception as e:
+            # Serve stale data rather than failing the order path
+            if not self._rows: raise
+            print(f"⚠️ Catalog refresh failed, serving stale: {e}")
+
+    def invalidate(self):
+        self._loaded_at = 0.0
+
+    def write_prices(self, rows):
+        # rows: {id, buy_price?, sell_price?}; only those columns are written (sql/013_service_price_writes.sql)
+        for part in chunked(rows, config.DB_WRITE_CHUNK):
+            supabase.rpc("update_service_prices", {"p_rows": part}).execute()
+        if rows: self.invalidate()
+
+    def get(self, local_id):
+        return self.get_many([local_id]).get(str(local_id))
+
+    def get_many(self, local_ids):
+        # Cache hits first, then one in_() round trip for ids added since the last refresh
+        self._ensure()
+        found = {}; missing = []
+        for i in {str(x) for x in local_ids}:
+            if i in self._by_id: found[i] = self._by_id[i]
+            elif i.isdigit(): missing.append(i)
+        for part in chunked(missing, self.PAGE):
+            for r in supabase.table("services").select("*").in_("id", part).execute().data or []:
+                found[str(r["id"])] = r
+        return found
+
+    def by_service_id(self, service_id):
+        self._ensure()
+        return self._by_service_id.get(str(service_id))
+
+    def by_name(self, name):
+        self._ensure()
+        return self._by_name.get(name)
+
+    def all(self):
+        self._ensure()
+        return list(self._rows)
+
+catalog = ServiceCatalog()
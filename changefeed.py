@@ -0,0 +1,84 @@
+import json
+import time
+import select
+import threading
+import config
+
+# 📡 CHANGE FEED
+# Scheduler jobs subscribe to their tables (Job triggers in scheduler.py). A Postgres
+# NOTIFY (see sql/001_change_feed.sql) or a local poke() runs the right job at once;
+# while the feed is live the timed poll only runs every FEED_FALLBACK_INTERVAL.
+
+class ChangeFeed:
+    def __init__(self):
+        self.live = False
+        self._lock = threading.Lock()
+        self._subs = {}
+
+    def subscribe(self, table, fn):
+        with self._lock: self._subs.setdefault(table, []).append(fn)
+
+    def poke(self, table, row=None):
+        for fn in list(self._subs.get(table, [])):
+            try: fn(row or {})
+            except Exception as e: print(f"⚠️ Change feed handler error ({table}): {e}")
+
+    def wake_all(self):
+        with self._lock: tables = list(self._subs)
+        for t in tables: self.poke(t)
+
+    def start(self):
+        pass
+
+class LocalChangeFeed(ChangeFeed):
+    # In-process stand-in: same interface, fed by poke()/notify() from this process or tests
+    def notify(self, payload):
+        msg = json.loads(payload) if isinstance(payload, str) else payload
+        self.poke(msg.get("table"), msg)
+
+class PgChangeFeed(ChangeFeed):
+    def __init__(self, dsn, channel="bot_changes"):
+        super().__init__()
+        self.dsn = dsn
+        self.channel = channel
+        self._thread = None
+
+    def start(self):
+        if self._thread: return
+        self._thread = threading.Thread(target=self._run, name="changefeed", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        import psycopg2
+        backoff = 1
+        while True:
+            conn = None
+            try:
+                conn = psycopg2.connect(self.dsn)
+                conn.autocommit = True
+                cur = conn.cursor()
+                cur.execute(f"LISTEN {self.channel};")
+                self.live = True; backoff = 1
+                self.wake_all()  # catch up on anything missed while disconnected
+                print("📡 Change feed connected")
+                while True:
+                    if select.select([conn], [], [], 60) == ([], [], []):
+                        cur.execute("SELECT 1"); continue  # keep the idle connection alive
+                    conn.poll()
+                    while conn.notifies:
+                        n = conn.notifies.pop(0)
+                        try:
+                            msg = json.loads(n.payload)
+                            self.poke(msg.get("table"), msg)
+                        except ValueError: pass
+            except Exception as e:
+                self.live = False
+                print(f"⚠️ Change feed down ({e}), retrying in {backoff}s")
+                self.wake_all()
+                time.sleep(backoff); backoff = min(backoff * 2, 60)
+            finally:
+                if conn is not None:
+                    try: conn.close()
+                    except Exception: pass
+
+change_feed = PgChangeFeed(config.DATABASE_URL) if config.DATABASE_URL else LocalChangeFeed()
@@ -0,0 +1,149 @@
+import asyncio
+import hashlib
+import html
+from telegram.error import BadRequest, RetryAfter
+import config
+from utils import classify_service
+from db import supabase, fetch_all, run_sync
+
+# 📣 CHANNEL PUBLISHER (sql/008_channel_posts.sql)
+# /post renders every category into chunks and hashes each chunk's text. Only chunks
+# whose hash differs from channel_posts are queued; one background task drains the
+# queue at CHANNEL_POST_INTERVAL (honouring 429 retry_after), so the bot stays responsive.
+# One /post at a time: a diff taken while a drain is still writing channel_posts would
+# queue the same chunks twice and orphan the first message ids.
+CHUNK_LIMIT = 3800
+FOOTER = "➖➖➖➖➖➖➖➖➖➖\n👇 Click blue text to Order"
+
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def _quote(value):
+    return '"' + str(value).replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+def stream_services(page=None):
+    # Keyset over (category, id): constant memory per page, no upper bound on catalog size
+    page = page or config.CHANNEL_PAGE_SIZE
+    cur_cat, cur_id = None, 0
+    while True:
+        q = (supabase.table("services").select("id, service_name, category, type, GoodsName, icon")
+             .not_.is_("type", None).neq("type", "Demo").not_.is_("category", None))
+        if cur_cat is not None: q = q.or_(f"category.gt.{_quote(cur_cat)},and(category.eq.{_quote(cur_cat)},id.gt.{cur_id})")
+        rows = q.order("category").order("id").limit(page).execute().data or []
+        yield from rows
+        if len(rows) < page: return
+        cur_cat, cur_id = rows[-1]["category"], rows[-1]["id"]
+
+def category_header(category, first):
+    sType = first.get('type', ''); sGoods = first.get('GoodsName', '')
+    sub_header = ""
+    if sType and sType != 'Default': sub_header += f"Type = {html.escape(sType)}"
+    if sGoods:
+        if sub_header: sub_header += f" | {html.escape(sGoods)}"
+        else: sub_header += f"Goods = {html.escape(sGoods)}"
+    header = f"📂 <b>{html.escape(category)}</b>\n"
+    if sub_header: header += f"{sub_header}\n"
+    return header + "➖➖➖➖➖➖➖➖➖➖\n\n"
+
+def render_chunks(rows, bot_username):
+    # Single pass over rows grouped by category (stream_services order) -> (post_key, text, service_ids)
+    c = header = None; lines, ids, size, n = [], [], 0, 0
+    for s in rows:
+        if s['category'] != c:
+            if lines: yield f"{c}#{n}", header + "".join(lines) + FOOTER, ids
+            c, header = s['category'], category_header(s['category'], s)
+            lines, ids, size, n = [], [], 0, 0
+        icon = s.get('icon') or classify_service(s['service_name'])[0]
+        line = f"{icon} <a href='https://t.me/{bot_username}?start=order_{s['id']}'>ID:{s['id']} - {html.escape(s['service_name'])}</a>\n\n"
+        if lines and size + len(line) > CHUNK_LIMIT:
+            yield f"{c}#{n}", header + "".join(lines) + FOOTER, ids
+            lines, ids, size, n = [], [], 0, n + 1
+        lines.append(line); ids.append(s['id']); size += len(line)
+    if lines: yield f"{c}#{n}", header + "".join(lines) + FOOTER, ids
+
+class ChannelPublisher:
+    def __init__(self, interval=None):
+        self.interval = interval if interval is not None else config.CHANNEL_POST_INTERVAL
+        self._queue = None
+        self._task = None
+        self._planning = False
+
+    def busy(self):
+        return self._planning or (self._task is not None and not self._task.done())
+
+    async def publish(self, bot, chunks, report_chat_id):
+        # Returns None while a previous publish is still draining
+        if self.busy(): return None
+        # Rendering streams from the DB, so the diff runs off the event loop
+        self._planning = True
+        try: plan, ops = await run_sync(self._diff, chunks)
+        finally: self._planning = False
+        if not plan["chunks"]: return plan  # never wipe the channel because a render came back empty
+        ops.append({"op": "report", "chat_id": report_chat_id, "plan": plan})
+
+        if self._queue is None: self._queue = asyncio.Queue()
+        for o in ops: self._queue.put_nowait(o)
+        self._task = asyncio.create_task(self._drain(bot))
+        return plan
+
+    def _diff(self, chunks):
+        # Compare rendered chunks with channel_posts; only new/changed ones become ops
+        posts = {p['post_key']: p for p in fetch_all(lambda: supabase.table("channel_posts").select("*").order("post_key"))}
+        plan = {"chunks": 0, "queued": 0, "unchanged": 0, "removed": 0}
+        ops = []
+        for key, text, ids in chunks:
+            plan["chunks"] += 1
+            digest = content_hash(text); old = posts.pop(key, None)
+            if old and old.get('content_hash') == digest:
+                plan["unchanged"] += 1; continue
+            ops.append({"op": "put", "key": key, "text": text, "ids": ids, "hash": digest, "msg_id": old and old['channel_msg_id']})
+        for key, old in posts.items():  # categories that shrank or disappeared
+            ops.append({"op": "drop", "key": key, "msg_id": old['channel_msg_id']})
+        plan["queued"] = sum(1 for o in ops if o["op"] == "put"); plan["removed"] = len(ops) - plan["queued"]
+        return plan, ops
+
+    async def _drain(self, bot):
+        done = {"edited": 0, "sent": 0, "failed": 0}
+        while not self._queue.empty():
+            o = self._queue.get_nowait()
+            if o["op"] == "report":
+                p = o["plan"]
+                try: await bot.send_message(chat_id=o["chat_id"], text=f"✅ All Done.\n✏️ Edited {done['edited']} · 🆕 Sent {done['sent']} · 🗑️ Removed {p['removed']} · 💤 Unchanged {p['unchanged']}" + (f" · ❌ Failed {done['failed']}" if done['failed'] else ""))
+                except Exception as e: print(f"❌ Post report error: {e}")
+                done = {"edited": 0, "sent": 0, "failed": 0}
+                continue
+            while True:
+                try:
+                    await (self._put(bot, o, done) if o["op"] == "put" else self._drop(bot, o))
+                    break
+                except RetryAfter as e:
+                    ra = e.retry_after
+                    await asyncio.sleep((ra.total_seconds() if hasattr(ra, "total_seconds") else float(ra)) + 1)
+                except Exception as e:
+                    print(f"❌ CRITICAL POST ERROR ({o['key']}): {e}")
+                    done["failed"] += 1
+                    break
+            await asyncio.sleep(self.interval)
+
+    async def _put(self, bot, o, done):
+        msg_id = o["msg_id"]
+        if msg_id:
+            try:
+                await bot.edit_message_text(chat_id=config.CHANNEL_ID, message_id=msg_id, text=o["text"], parse_mode='HTML', disable_web_page_preview=True)
+                done["edited"] += 1
+            except BadRequest as e:
+                err = str(e).lower()
+                if "message is not modified" in err: pass
+                elif "message to edit not found" in err or "message can't be edited" in err: msg_id = None
+                else: raise
+        if not msg_id:
+            sent = await bot.send_message(chat_id=config.CHANNEL_ID, text=o["text"], parse_mode='HTML', disable_web_page_preview=True)
+            msg_id = sent.message_id; done["sent"] += 1
+        await run_sync(lambda: supabase.table("channel_posts").upsert({"post_key": o["key"], "channel_msg_id": msg_id, "content_hash": o["hash"], "service_ids": o["ids"]}).execute())
+
+    async def _drop(self, bot, o):
+        try: await bot.delete_message(chat_id=config.CHANNEL_ID, message_id=o["msg_id"])
+        except BadRequest as e: print(f"⚠️ Could not delete channel msg {o['msg_id']}: {e}")
+        await run_sync(lambda: supabase.table("channel_posts").delete().eq("post_key", o["key"]).execute())
+
+channel_publisher = ChannelPublisher()
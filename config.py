@@ -1,4 +1,5 @@
 import os
+import socket
 from dotenv import load_dotenv
 from zoneinfo import ZoneInfo
 
@@ -10,6 +11,7 @@ SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 SMM_API_KEY = os.getenv("SMM_API_KEY")
 SMM_API_URL = os.getenv("SMMGEN_URL", "https://smmgen.com/api/v2")
+DATABASE_URL = os.getenv("DATABASE_URL")  # direct Postgres DSN for LISTEN/NOTIFY (optional)
 
 # Groups
 CHANNEL_ID = int(os.getenv("CHANNEL_ID", "0")) 
@@ -23,6 +25,50 @@ SUPPORT_GROUP_ID = int(os.getenv("SUPPORT_GROUP_ID", "0"))
 USD_TO_MMK = 4500
 TZ = ZoneInfo("Asia/Yangon")
 
+# Workers & Caches
+SMM_POOL_SIZE = int(os.getenv("SMM_POOL_SIZE", "10"))
+SMM_STATUS_BATCH_PAUSE = float(os.getenv("SMM_STATUS_BATCH_PAUSE", "0.2"))
+SUBMIT_WORKERS = int(os.getenv("SUBMIT_WORKERS", "8"))
+SUBMIT_QUEUE = int(os.getenv("SUBMIT_QUEUE", "32"))
+SUPPLIER_CONCURRENCY = {"smmgen": int(os.getenv("SMMGEN_CONCURRENCY", "6")), "k2boost": int(os.getenv("K2BOOST_CONCURRENCY", "2"))}
+SUBMIT_JOURNAL_PATH = os.getenv("SUBMIT_JOURNAL_PATH", "data/submit_journal.jsonl")
+RELEASE_ORPHAN_CLAIMS = os.getenv("RELEASE_ORPHAN_CLAIMS", "1") == "1"
+FEED_FALLBACK_INTERVAL = int(os.getenv("FEED_FALLBACK_INTERVAL", "60"))
+WATERMARK_OVERLAP = int(os.getenv("WATERMARK_OVERLAP", "30"))
+WATERMARK_SWEEP_INTERVAL = int(os.getenv("WATERMARK_SWEEP_INTERVAL", "3600"))
+STATUS_TICK = int(os.getenv("STATUS_TICK", "15"))
+STATUS_RESYNC_INTERVAL = int(os.getenv("STATUS_RESYNC_INTERVAL", "900"))
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "16"))
+CATALOG_TTL = int(os.getenv("CATALOG_TTL", "300"))
+DB_WRITE_CHUNK = int(os.getenv("DB_WRITE_CHUNK", "500"))
+MASS_MAX_LINES = int(os.getenv("MASS_MAX_LINES", "10000"))
+MASS_FILE_MAX_BYTES = 5 * 1024 * 1024
+REWARD_SETTLE_INTERVAL = int(os.getenv("REWARD_SETTLE_INTERVAL", "300"))
+REWARD_SETTLE_BATCH = int(os.getenv("REWARD_SETTLE_BATCH", "5000"))
+SALES_ROLLUP_INTERVAL = int(os.getenv("SALES_ROLLUP_INTERVAL", "60"))
+SALES_ROLLUP_BATCH = int(os.getenv("SALES_ROLLUP_BATCH", "10000"))
+RATE_SYNC_INTERVAL = int(os.getenv("RATE_SYNC_INTERVAL", "300"))
+RATE_SYNC_FULL_INTERVAL = int(os.getenv("RATE_SYNC_FULL_INTERVAL", "3600"))
+SMM_SERVICES_TTL = int(os.getenv("SMM_SERVICES_TTL", "600"))
+SMM_SERVICES_CACHE_PATH = os.getenv("SMM_SERVICES_CACHE_PATH", "data/smm_services.json.gz")
+CHANNEL_POST_INTERVAL = float(os.getenv("CHANNEL_POST_INTERVAL", "3"))
+CHANNEL_PAGE_SIZE = int(os.getenv("CHANNEL_PAGE_SIZE", "1000"))
+JOB_JITTER = float(os.getenv("JOB_JITTER", "0.1"))
+JOB_MAX_BACKOFF = int(os.getenv("JOB_MAX_BACKOFF", "600"))
+PRICING_TTL = int(os.getenv("PRICING_TTL", "300"))
+
+# Replicas (leader leases for singleton jobs, order/status work sharded by order id)
+REPLICA_COUNT = max(1, int(os.getenv("REPLICA_COUNT", "1")))
+REPLICA_INDEX = int(os.getenv("REPLICA_INDEX", "0"))
+REPLICA_ID = os.getenv("REPLICA_ID") or f"{socket.gethostname()}-{os.getpid()}"
+LEASE_TTL = int(os.getenv("LEASE_TTL", "60"))
+
+# Notifications (outbox pacing + optional digest, e.g. DIGEST_GROUPS=SUPPLIER_GROUP_ID,AFFILIATE_GROUP_ID)
+OUTBOX_CHAT_INTERVAL = float(os.getenv("OUTBOX_CHAT_INTERVAL", "3"))
+OUTBOX_GLOBAL_INTERVAL = float(os.getenv("OUTBOX_GLOBAL_INTERVAL", "0.04"))
+DIGEST_INTERVAL = int(os.getenv("DIGEST_INTERVAL", "30"))
+DIGEST_CHATS = {globals()[g.strip()] for g in os.getenv("DIGEST_GROUPS", "").split(",") if g.strip().endswith("_GROUP_ID")}
+
 # Conversation States
 WAITING_EMAIL, WAITING_PASSWORD, LOGIN_LANG, LOGIN_CURR = range(4)
 ORDER_WAITING_LINK, ORDER_WAITING_QTY, ORDER_CONFIRM, ORDER_WAITING_COMMENTS = range(4, 8) # 🔥 Added ORDER_WAITING_COMMENTS (Index 7)
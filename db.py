@@ -1,8 +1,43 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
 from supabase import create_client, Client
 import config
 
 supabase: Client = create_client(config.SUPABASE_URL, config.SUPABASE_KEY)
 
+# 🧵 Bounded pool so blocking PostgREST round trips never run on the bot's event loop
+_pool = ThreadPoolExecutor(max_workers=config.DB_POOL_SIZE, thread_name_prefix="db")
+
+def chunked(seq, size):
+    seq = list(seq)
+    for i in range(0, len(seq), size): yield seq[i:i + size]
+
+def fetch_all(make_query, page=1000):
+    # PostgREST caps responses (1000 rows by default); make_query must return a fresh, ordered builder
+    rows = []; start = 0
+    while True:
+        data = make_query().range(start, start + page - 1).execute().data or []
+        rows.extend(data)
+        if len(data) < page: return rows
+        start += page
+
+def insert_chunked(table, rows, chunk=None):
+    inserted = []
+    for part in chunked(rows, chunk or config.DB_WRITE_CHUNK):
+        inserted.extend(supabase.table(table).insert(part).execute().data or [])
+    return inserted
+
 def get_user(tg_id):
     res = supabase.table('users').select("*").eq('telegram_id', tg_id).execute()
     return res.data[0] if res.data else None
+
+async def run_sync(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_pool, functools.partial(fn, *args, **kwargs))
+
+async def execute_async(query):
+    return await run_sync(query.execute)
+
+async def get_user_async(tg_id):
+    return await run_sync(get_user, tg_id)
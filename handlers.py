@@ -1,17 +1,24 @@
-import requests
+import io
 import re
 import html
-import time
-import unicodedata 
+from datetime import datetime, timedelta
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup, KeyboardButton, ReplyKeyboardRemove
 from telegram.ext import ContextTypes, ConversationHandler
 import config
-from db import supabase, get_user
-from utils import get_text, format_currency, calculate_cost, format_for_user, clean_service_name, calculate_sell_price, get_link_prompt
+from db import supabase, execute_async, get_user_async, run_sync, insert_chunked, chunked
+import ledger
+from smm_services import smm_services
+from catalog import catalog
+from journal import journal
+from status_schedule import status_scheduler
+from outbox import outbox
+from changefeed import change_feed
+from pricing import pricing
+from channel import channel_publisher, render_chunks, stream_services
+from utils import get_text, format_currency, calculate_cost, format_for_user, clean_service_name, get_link_prompt, build_order_row, parse_mass_lines, paginate_blocks
 
 def notify_group(chat_id, text):
-    try: requests.post(f"https://api.telegram.org/bot{config.BOT_TOKEN}/sendMessage", json={"chat_id": chat_id, "text": text, "parse_mode": "HTML", "disable_web_page_preview": True}, timeout=10)
-    except: pass
+    outbox.send(chat_id, text)
 
 # =========================================
 # 🔐 AUTH & START HANDLERS
@@ -19,7 +26,7 @@ def notify_group(chat_id, text):
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
-    db_user = get_user(user.id)
+    db_user = await get_user_async(user.id)
     args = context.args
     
     if update.effective_chat.type != 'private':
@@ -63,9 +70,9 @@ async def receive_password(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     msg = await update.message.reply_text("🔄 Verifying...")
     try:
-        session = supabase.auth.sign_in_with_password({"email": email, "password": password})
+        session = await run_sync(supabase.auth.sign_in_with_password, {"email": email, "password": password})
         if session.user:
-            supabase.table('users').update({'telegram_id': update.effective_user.id}).eq('id', session.user.id).execute()
+            await execute_async(supabase.table('users').update({'telegram_id': update.effective_user.id}).eq('id', session.user.id))
             
             pending_id = context.user_data.pop('pending_order_id', None)
             if pending_id:
@@ -93,7 +100,7 @@ async def login_set_lang(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def login_set_curr(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query; await query.answer()
-    supabase.table('users').update({'language': context.user_data.get('temp_lang'), 'currency': query.data.split("_")[1]}).eq('telegram_id', update.effective_user.id).execute()
+    await execute_async(supabase.table('users').update({'language': context.user_data.get('temp_lang'), 'currency': query.data.split("_")[1]}).eq('telegram_id', update.effective_user.id))
     await query.edit_message_text("✅ Setup Done!")
     await help_command(update, context); return ConversationHandler.END
 
@@ -105,7 +112,7 @@ async def cancel_op(update: Update, context: ContextTypes.DEFAULT_TYPE):
 # ℹ️ HELPERS
 # =========================================
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user_id = update.effective_user.id; db_user = get_user(user_id)
+    user_id = update.effective_user.id; db_user = await get_user_async(user_id)
     if not db_user: return await start(update, context)
     
     bal = format_currency(float(db_user.get('balance_usd', 0)), db_user.get('currency', 'USD'))
@@ -119,14 +126,14 @@ async def check_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     input_ids = context.args[0].split(',')
     msg = ""
-    user = get_user(update.effective_user.id)
+    user = await get_user_async(update.effective_user.id)
     
     for oid in input_ids:
         oid = oid.strip()
         if not oid: continue
         
         try:
-            data = supabase.table('WebsiteOrders').select("*").eq('email', user['email']).or_(f"id.eq.{oid},supplier_order_id.eq.{oid}").execute().data
+            data = (await execute_async(supabase.table('WebsiteOrders').select("*").eq('email', user['email']).or_(f"id.eq.{oid},supplier_order_id.eq.{oid}"))).data
             
             if data:
                 o = data[0]
@@ -142,7 +149,7 @@ async def check_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def history_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
-        orders = supabase.table('WebsiteOrders').select("*").eq('email', get_user(update.effective_user.id)['email']).order('id', desc=True).limit(5).execute().data
+        orders = (await execute_async(supabase.table('WebsiteOrders').select("*").eq('email', (await get_user_async(update.effective_user.id))['email']).order('id', desc=True).limit(5))).data
         if not orders: return await update.message.reply_text("No history.")
         
         msg = "📜 <b>History (Last 5)</b>\n\n"
@@ -184,10 +191,10 @@ async def setting_process(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query; await query.answer()
     data = query.data; user_id = update.effective_user.id
     if "set_en" in data or "set_mm" in data:
-        supabase.table('users').update({'language': "en" if "en" in data else "mm"}).eq('telegram_id', user_id).execute()
+        await execute_async(supabase.table('users').update({'language': "en" if "en" in data else "mm"}).eq('telegram_id', user_id))
         await query.message.edit_text("✅ Language Updated!")
     elif "set_USD" in data or "set_MMK" in data:
-        supabase.table('users').update({'currency': "USD" if "USD" in data else "MMK"}).eq('telegram_id', user_id).execute()
+        await execute_async(supabase.table('users').update({'currency': "USD" if "USD" in data else "MMK"}).eq('telegram_id', user_id))
         await query.message.edit_text("✅ Currency Updated!")
     await help_command(update, context); return ConversationHandler.END
 
@@ -196,7 +203,7 @@ async def setting_process(update: Update, context: ContextTypes.DEFAULT_TYPE):
 # =========================================
 
 async def new_order_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user = update.effective_user; db_user = get_user(user.id)
+    user = update.effective_user; db_user = await get_user_async(user.id)
     if not db_user: return await start(update, context)
     
     target_id = None
@@ -209,12 +216,12 @@ async def new_order_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
     if "order_" in target_id: target_id = target_id.split("_")[1]
     
-    res = supabase.table('services').select("*").eq('id', target_id).execute()
-    if not res.data:
+    svc = await run_sync(catalog.get, target_id)
+    if not svc:
         await update.message.reply_text("❌ ID Not Found.")
         return ConversationHandler.END
         
-    svc = res.data[0]; context.user_data['order_svc'] = svc
+    context.user_data['order_svc'] = svc
     
     link_type = get_link_prompt(svc['service_name'])
     prompt = f"🔗 <b>Enter {link_type} for:</b>\n<i>{html.escape(svc['service_name'])}</i>"
@@ -275,7 +282,7 @@ async def new_order_comments(update: Update, context: ContextTypes.DEFAULT_TYPE)
     cost = calculate_cost(qty, svc)
     context.user_data['cost_usd'] = cost
     
-    user = get_user(update.effective_user.id)
+    user = await get_user_async(update.effective_user.id)
     cost_display = format_currency(cost, user.get('currency', 'USD'))
     text = get_text(user.get('language','en'), 'confirm_order', cost=cost_display)
     text += f"\n📝 Comments: {qty} lines"
@@ -303,7 +310,7 @@ async def new_order_qty(update: Update, context: ContextTypes.DEFAULT_TYPE):
     cost = calculate_cost(qty, svc)
     context.user_data['cost_usd'] = cost
     
-    user = get_user(update.effective_user.id)
+    user = await get_user_async(update.effective_user.id)
     cost_display = format_currency(cost, user.get('currency', 'USD'))
     text = get_text(user.get('language','en'), 'confirm_order', cost=cost_display)
     
@@ -317,47 +324,26 @@ async def new_order_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await query.edit_message_text("🚫 Canceled.")
         return ConversationHandler.END
         
-    user = get_user(update.effective_user.id)
+    user = await get_user_async(update.effective_user.id)
     cost = context.user_data['cost_usd']
     svc = context.user_data['order_svc']
     qty = context.user_data['order_qty']
     link = context.user_data['order_link']
     comments = context.user_data.get('custom_comments', None)
     
-    if float(user['balance_usd']) < cost:
-        await query.edit_message_text(f"⚠️ <b>Insufficient Balance</b>\n\n💵 Cost: ${cost:.4f}\n💰 Your Balance: ${user['balance_usd']:.4f}\n\nPlease top up.", parse_mode='HTML')
+    # Debit is conditional on the balance covering it, so two quick orders can't overdraw
+    new_bal = await run_sync(ledger.debit, user['email'], cost, "order")
+    if new_bal is None:
+        await query.edit_message_text(f"⚠️ <b>Insufficient Balance</b>\n\n💵 Cost: ${cost:.4f}\n💰 Your Balance: ${float(user['balance_usd']):.4f}\n\nPlease top up.", parse_mode='HTML')
         return ConversationHandler.END
         
     try:
-        new_bal = float(user['balance_usd']) - cost
-        supabase.table('users').update({'balance_usd': new_bal}).eq('telegram_id', update.effective_user.id).execute()
-        
-        per_qty = int(svc.get('per_quantity', 1000))
-        if per_qty < 1: per_qty = 1000
-        buy_price = float(svc.get('buy_price', 0))
-        buy_charge = (buy_price / per_qty) * qty
-        
-        o_data = {
-            "email": user['email'],
-            "service": svc['service_name'],
-            "quantity": qty,
-            "link": link,
-            "day": 1,
-            "remain": qty,
-            "start_count": 0,
-            "buy_charge": round(buy_charge, 6),
-            "sell_charge": round(cost, 6),
-            "supplier_service_id": svc['service_id'],
-            "supplier_name": svc['source'],
-            "status": "Pending",
-            "UsedType": svc['use_type'],
-            "supplier_order_id": 0
-        }
-        
-        if comments:
-            o_data['comments'] = comments
-        
-        inserted = supabase.table('WebsiteOrders').insert(o_data).execute()
+        o_data = build_order_row(user['email'], svc, qty, link, cost, comments)
+        try: inserted = await execute_async(supabase.table('WebsiteOrders').insert(o_data))
+        except Exception:
+            await run_sync(ledger.credit, user['email'], cost, "order_failed")
+            raise
+        change_feed.poke('WebsiteOrders')
         await query.edit_message_text(f"✅ <b>Order Queued!</b>\nID: {inserted.data[0]['id']}", parse_mode='HTML')
         
     except Exception as e:
@@ -372,100 +358,126 @@ async def cancel_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     return ConversationHandler.END
 
 # --- MASS ORDER (STRICT FILTER) ---
+MASS_UNSUPPORTED = ['Custom Comments', 'Poll', 'Comment Likes']
+
 async def mass_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    await update.message.reply_text("🚀 <b>Mass Order</b>\nFormat: <code>ID Link Qty</code>\n(Space separated, One per line)", parse_mode='HTML')
+    await update.message.reply_text("🚀 <b>Mass Order</b>\nFormat: <code>ID Link Qty</code>\n(Space separated, One per line)\n\n📎 Or upload a .txt / .csv file with one order per line.", parse_mode='HTML')
     return config.WAITING_MASS_INPUT
 
 async def mass_process(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    lines = update.message.text.strip().split('\n'); valid = []; total = 0.0
-    details_msg = "📝 <b>Order Details:</b>\n\n"
+    return await mass_preview(update, context, update.message.text.strip().split('\n'))
+
+async def mass_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    doc = update.message.document
+    if doc.file_size and doc.file_size > config.MASS_FILE_MAX_BYTES:
+        await update.message.reply_text(f"❌ File too large (max {config.MASS_FILE_MAX_BYTES // 1024 // 1024} MB).")
+        return config.WAITING_MASS_INPUT
+    buf = io.BytesIO()
+    await (await doc.get_file()).download_to_memory(buf)
+    buf.seek(0)
+    # Lines are decoded lazily as the parser walks the file
+    header = (doc.file_name or '').lower().endswith('.csv')
+    return await mass_preview(update, context, io.TextIOWrapper(buf, encoding='utf-8-sig', errors='replace'), header)
+
+async def mass_preview(update: Update, context: ContextTypes.DEFAULT_TYPE, lines, header=False):
+    parsed = []; errors = []
+    for n, sid, link, qty, err in parse_mass_lines(lines, header):
+        if err: errors.append((n, err))
+        else: parsed.append((n, sid, link, qty))
+        if len(parsed) >= config.MASS_MAX_LINES:
+            errors.append((n, f"limit of {config.MASS_MAX_LINES} orders reached, remaining lines ignored"))
+            break
+    
+    # One catalog/in_() lookup for every ID instead of a query per line
+    svc_map = await run_sync(catalog.get_many, [sid for _, sid, _, _ in parsed])
+    
+    valid = []; total = 0.0; blocks = []
+    for n, sid, link, qty in parsed:
+        svc = svc_map.get(str(sid))
+        if not svc: errors.append((n, f"service ID {sid} not found")); continue
+        if svc.get('use_type') in MASS_UNSUPPORTED: errors.append((n, f"'{svc.get('use_type')}' services not supported")); continue
+        if qty < int(svc['min']) or qty > int(svc['max']): errors.append((n, f"qty {qty} outside {svc['min']}-{svc['max']}")); continue
+            
+        cost = calculate_cost(qty, svc); total += cost
+        valid.append({'svc': svc, 'link': link, 'qty': qty, 'cost': cost})
+        
+        blocks.append(
+            f"📦 <b>{html.escape(svc['service_name'])}</b>\n"
+            f"🔗 {html.escape(link)}\n"
+            f"🔢 Qty: {qty} | 💰 ${cost:.4f}\n"
+            f"--------------------\n"
+        )
+    
+    errors.sort()
+    blocks += [f"⚠️ Line {n}: {html.escape(err)}\n" for n, err in errors]
     
-    for line in lines:
-        try:
-            line = line.replace('|', ' ') 
-            p = line.split()
-            if len(p) != 3: continue
-            res = supabase.table('services').select("*").eq('id', p[0]).execute()
-            if res.data:
-                svc = res.data[0]
-                if svc.get('use_type') in ['Custom Comments', 'Poll', 'Comment Likes']:
-                    continue
-                    
-                cost = calculate_cost(int(p[2]), svc); total += cost
-                valid.append({'svc': svc, 'link': p[1], 'qty': int(p[2]), 'cost': cost})
-                
-                details_msg += (
-                    f"📦 <b>{html.escape(svc['service_name'])}</b>\n"
-                    f"🔗 {html.escape(p[1])}\n"
-                    f"🔢 Qty: {p[2]} | 💰 ${cost:.4f}\n"
-                    f"--------------------\n"
-                )
-        except: continue
-        
     context.user_data['mass_queue'] = valid; context.user_data['mass_total'] = total
-    curr = get_user(update.effective_user.id).get('currency', 'USD')
+    curr = (await get_user_async(update.effective_user.id)).get('currency', 'USD')
     
     if not valid:
-         await update.message.reply_text("❌ No valid orders found.\nNote: 'Custom Comments' services are not supported in Mass Order.", parse_mode='HTML')
-         return config.WAITING_MASS_INPUT
+        err_text = paginate_blocks([f"⚠️ Line {n}: {html.escape(err)}\n" for n, err in errors], 3000)
+        await update.message.reply_text("❌ No valid orders found.\nNote: 'Custom Comments' services are not supported in Mass Order.\n\n" + (err_text[0] if err_text else ""), parse_mode='HTML')
+        return config.WAITING_MASS_INPUT
 
-    confirm_msg = (
-        f"{details_msg}"
+    context.user_data['mass_pages'] = paginate_blocks(blocks)
+    context.user_data['mass_summary'] = (
         f"📊 <b>Summary:</b>\n"
         f"✅ Valid Orders: {len(valid)}\n"
+        f"❌ Skipped Lines: {len(errors)}\n"
         f"💵 Total Cost: {format_currency(total, curr)}\n\n"
         f"❓ <b>Confirm Order?</b>"
     )
     
-    await update.message.reply_text(confirm_msg, parse_mode='HTML', reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("✅ Yes", callback_data="mass_yes"), InlineKeyboardButton("❌ No", callback_data="mass_no")]]))
+    text, markup = mass_page_view(context, 0)
+    await update.message.reply_text(text, parse_mode='HTML', reply_markup=markup, disable_web_page_preview=True)
     return config.WAITING_MASS_CONFIRM
 
+def mass_page_view(context, idx):
+    pages = context.user_data['mass_pages']
+    idx = max(0, min(idx, len(pages) - 1))
+    text = f"📝 <b>Order Details:</b>\n\n{pages[idx]}\n{context.user_data['mass_summary']}"
+    kb = []
+    if len(pages) > 1:
+        kb.append([
+            InlineKeyboardButton("◀️", callback_data=f"mass_page_{idx - 1}"),
+            InlineKeyboardButton(f"{idx + 1}/{len(pages)}", callback_data=f"mass_page_{idx}"),
+            InlineKeyboardButton("▶️", callback_data=f"mass_page_{idx + 1}")
+        ])
+    kb.append([InlineKeyboardButton("✅ Yes", callback_data="mass_yes"), InlineKeyboardButton("❌ No", callback_data="mass_no")])
+    return text, InlineKeyboardMarkup(kb)
+
 async def mass_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query; await query.answer()
+    if query.data.startswith('mass_page_'):
+        text, markup = mass_page_view(context, int(query.data.rsplit('_', 1)[1]))
+        try: await query.edit_message_text(text, parse_mode='HTML', reply_markup=markup, disable_web_page_preview=True)
+        except: pass  # same page re-clicked -> "message is not modified"
+        return config.WAITING_MASS_CONFIRM
     if query.data == 'mass_no':
         await query.edit_message_text("🚫 Canceled.")
         await help_command(update, context)
         return ConversationHandler.END
         
-    user = get_user(update.effective_user.id); total = context.user_data['mass_total']
+    user = await get_user_async(update.effective_user.id); total = context.user_data['mass_total']
     
-    if float(user['balance_usd']) < total:
+    new_bal = await run_sync(ledger.debit, user['email'], total, "mass_order")
+    if new_bal is None:
         await query.edit_message_text(f"⚠️ <b>Insufficient Balance</b>\nNeeded: ${total}\nHas: ${user['balance_usd']}", parse_mode='HTML')
         await help_command(update, context)
         return ConversationHandler.END
         
     try:
-        new_bal = float(user['balance_usd']) - total
-        supabase.table('users').update({'balance_usd': new_bal}).eq('telegram_id', update.effective_user.id).execute()
-        
-        for o in context.user_data['mass_queue']:
-            svc = o['svc']
-            qty = o['qty']
-            
-            per_qty = int(svc.get('per_quantity', 1000))
-            if per_qty < 1: per_qty = 1000
-            
-            buy_price = float(svc.get('buy_price', 0))
-            buy_charge = (buy_price / per_qty) * qty
-            
-            o_data = {
-                "email": user['email'],
-                "service": svc['service_name'],
-                "quantity": qty,
-                "link": o['link'],
-                "day": 1,
-                "remain": qty,
-                "start_count": 0,
-                "buy_charge": round(buy_charge, 6),
-                "sell_charge": round(o['cost'], 6),
-                "supplier_service_id": svc['service_id'],
-                "supplier_name": svc['source'],
-                "status": "Pending",
-                "UsedType": svc['use_type'],
-                "supplier_order_id": 0
-            }
-            
-            supabase.table('WebsiteOrders').insert(o_data).execute()
+        rows = [build_order_row(user['email'], o['svc'], o['qty'], o['link'], o['cost']) for o in context.user_data['mass_queue']]
+        placed = 0.0
+        try:
+            for part in chunked(rows, config.DB_WRITE_CHUNK):
+                await run_sync(insert_chunked, 'WebsiteOrders', part)
+                placed += sum(r['sell_charge'] for r in part)
+        except Exception:
+            # Chunks inserted before the failure are real orders; refund only the rest
+            await run_sync(ledger.credit, user['email'], round(total - placed, 6), "mass_order_failed")
+            raise
+        change_feed.poke('WebsiteOrders')
             
         await query.edit_message_text("✅ <b>Mass Order Queued!</b>", parse_mode='HTML')
         
@@ -489,7 +501,7 @@ async def sup_process(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def sup_save(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
-        user = get_user(update.effective_user.id)
+        user = await get_user_async(update.effective_user.id)
         raw_text = update.message.text
         subject = context.user_data.get('stype', 'Support')
 
@@ -502,7 +514,7 @@ async def sup_save(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await update.message.reply_text("❌ No valid numbers found.")
             return ConversationHandler.END
 
-        valid_orders = supabase.table('WebsiteOrders').select("id, supplier_order_id").or_(f"id.in.({','.join(input_ids)}),supplier_order_id.in.({','.join(input_ids)})").eq("email", user['email']).execute().data
+        valid_orders = (await execute_async(supabase.table('WebsiteOrders').select("id, supplier_order_id").or_(f"id.in.({','.join(input_ids)}),supplier_order_id.in.({','.join(input_ids)})").eq("email", user['email']))).data
         
         confirmed_ids = []
         for iid in input_ids:
@@ -523,7 +535,8 @@ async def sup_save(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if confirmed_ids:
             joined_ids = ", ".join(confirmed_ids)
             custom_msg = f"{joined_ids} {subject}"
-            supabase.table('SupportBox').insert({"email": user['email'], "subject": subject, "order_id": joined_ids, "message": custom_msg, "status": "Pending", "UserStatus": "unread"}).execute()
+            await execute_async(supabase.table('SupportBox').insert({"email": user['email'], "subject": subject, "order_id": joined_ids, "message": custom_msg, "status": "Pending", "UserStatus": "unread"}))
+            change_feed.poke('SupportBox')
             await update.message.reply_text(f"✅ Ticket Created for {len(confirmed_ids)} orders.")
             
     except Exception as e:
@@ -540,7 +553,7 @@ async def admin_answer_ticket(update: Update, context: ContextTypes.DEFAULT_TYPE
     try:
         if len(context.args) < 2: return await update.message.reply_text("⚠️ Usage: /Answer <ID> <Message>")
         tid = context.args[0]; reply_msg = " ".join(context.args[1:])
-        data = supabase.table("SupportBox").update({"reply_text": reply_msg, "status": "Replied", "UserStatus": "unread"}).eq("id", tid).execute()
+        data = await execute_async(supabase.table("SupportBox").update({"reply_text": reply_msg, "status": "Replied", "UserStatus": "unread"}).eq("id", tid))
         if data.data: await update.message.reply_text(f"✅ Replied to Ticket #{tid}")
         else: await update.message.reply_text("❌ Ticket ID not found.")
     except Exception as e: await update.message.reply_text(f"❌ Error: {e}")
@@ -550,25 +563,51 @@ async def admin_ticket_close(update: Update, context: ContextTypes.DEFAULT_TYPE)
     try:
         if not context.args: return await update.message.reply_text("⚠️ Usage: /Close <ID>")
         tid = context.args[0]
-        supabase.table("SupportBox").update({"status": "Closed"}).eq("id", tid).execute()
+        await execute_async(supabase.table("SupportBox").update({"status": "Closed"}).eq("id", tid))
         await update.message.reply_text(f"🔒 Ticket #{tid} Closed.")
     except Exception as e: await update.message.reply_text(f"❌ Error: {e}")
 
 async def admin_check_balance(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.effective_chat.id != config.AFFILIATE_GROUP_ID: return
     try:
-        u = supabase.table("users").select("balance_usd").eq("email", context.args[0]).execute().data
+        u = (await execute_async(supabase.table("users").select("balance_usd").eq("email", context.args[0]))).data
         await update.message.reply_text(f"💰 Balance: ${u[0]['balance_usd']}" if u else "❌ Not found")
     except: pass
 
+async def admin_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_chat.id != config.REPORT_GROUP_ID: return
+    try:
+        # Reads the rollups only (sql/006_sales_rollups.sql): 30 day rows + top 5 services
+        today = datetime.now(config.TZ).date()
+        days = (await execute_async(supabase.table("sales_by_day").select("*").gte("day", (today - timedelta(days=29)).isoformat()))).data or []
+        top = (await execute_async(supabase.table("sales_by_service").select("*").order("spend", desc=True).limit(5))).data or []
+
+        def window(n):
+            since = (today - timedelta(days=n - 1)).isoformat()
+            rows = [d for d in days if d['day'] >= since]
+            return sum(float(d['spend']) for d in rows), sum(float(d['refunds']) for d in rows), sum(int(d['events']) for d in rows)
+
+        lines = ["📊 <b>Sales Stats</b>\n"]
+        for label, n in (("Today", 1), ("7 days", 7), ("30 days", 30)):
+            spend, refunds, events = window(n)
+            lines.append(f"<b>{label}:</b> ${spend:,.2f} spend · ${refunds:,.2f} refunded · {events} orders")
+        if top:
+            names = await run_sync(catalog.get_many, [t['service_local_id'] for t in top])
+            lines.append("\n🏆 <b>Top Services</b>")
+            for t in top:
+                svc = names.get(str(t['service_local_id']))
+                name = html.escape(clean_service_name(svc['service_name'])) if svc else f"#{t['service_local_id']}"
+                lines.append(f"• {name}: ${float(t['spend']):,.2f} ({int(t['sold_qty']):,} sold)")
+        await update.message.reply_text("\n".join(lines), parse_mode='HTML')
+    except Exception as e: await update.message.reply_text(f"❌ Stats error: {e}")
+
 async def admin_manual_topup(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.effective_chat.id != config.AFFILIATE_GROUP_ID: return
     try:
         email = context.args[0]; amt = float(context.args[1])
-        u = supabase.table("users").select("balance_usd").eq("email", email).execute().data
-        if u:
-            old = float(u[0]['balance_usd']); new = old + amt
-            supabase.table("users").update({"balance_usd": new}).eq("email", email).execute()
+        new = await run_sync(ledger.credit, email, amt, "manual_topup")
+        if new is not None:
+            old = round(new - amt, 4)
             notify_group(config.AFFILIATE_GROUP_ID, f"✅ <b>Manual Topup</b>\nUser: <code>{email}</code>\nAdded: ${amt}\nBal: ${old} ➝ ${new}")
             await update.message.reply_text("Done.")
     except: pass
@@ -576,82 +615,97 @@ async def admin_manual_topup(update: Update, context: ContextTypes.DEFAULT_TYPE)
 async def admin_tx_approve(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.effective_chat.id != config.AFFILIATE_GROUP_ID: return
     try:
-        tx_id = int(context.args[0]); tx = supabase.table("transactions").select("*").eq("id", tx_id).execute().data
+        tx_id = int(context.args[0]); tx = (await execute_async(supabase.table("transactions").select("*").eq("id", tx_id))).data
         if tx and tx[0]['status'] != 'Accepted':
-            u = supabase.table("users").select("balance_usd").eq("email", tx[0]['email']).execute().data
-            if u:
-                old = float(u[0]['balance_usd']); new = old + float(tx[0]['amount'])
-                supabase.table("users").update({"balance_usd": new}).eq("email", tx[0]['email']).execute()
-                supabase.table("transactions").update({"status": "Accepted"}).eq("id", tx_id).execute()
-                notify_group(config.AFFILIATE_GROUP_ID, f"✅ <b>Approved</b>\nUser: <code>{tx[0]['email']}</code>\nBal: ${old} ➝ ${new}")
-                await update.message.reply_text("Approved.")
+            # Claim first so a double /Approve (or the auto poller) can't credit twice
+            claimed = (await execute_async(supabase.table("transactions").update({"status": "Accepted"}).eq("id", tx_id).neq("status", "Accepted"))).data
+            if not claimed: return
+            new = await run_sync(ledger.credit, tx[0]['email'], float(tx[0]['amount']), "topup", tx_id)
+            if new is None:
+                await execute_async(supabase.table("transactions").update({"status": tx[0]['status']}).eq("id", tx_id))
+                return await update.message.reply_text("❌ User not found.")
+            old = round(new - float(tx[0]['amount']), 4)
+            notify_group(config.AFFILIATE_GROUP_ID, f"✅ <b>Approved</b>\nUser: <code>{tx[0]['email']}</code>\nBal: ${old} ➝ ${new}")
+            await update.message.reply_text("Approved.")
     except: pass
 
 async def admin_tx_reject(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.effective_chat.id != config.AFFILIATE_GROUP_ID: return
-    try: supabase.table("transactions").update({"status": "Rejected"}).eq("id", int(context.args[0])).execute(); await update.message.reply_text("Rejected.")
+    try: await execute_async(supabase.table("transactions").update({"status": "Rejected"}).eq("id", int(context.args[0]))); await update.message.reply_text("Rejected.")
     except: pass
 
 async def admin_aff_accept(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.effective_chat.id != config.AFFILIATE_GROUP_ID: return
     try:
         aff_id = int(context.args[0])
-        res = supabase.table("affiliate").select("*").eq("id", aff_id).execute().data
+        res = (await execute_async(supabase.table("affiliate").select("*").eq("id", aff_id))).data
         if res:
             row = res[0]; email = row["email"]; amount = float(row["amount"])
-            u = supabase.table("users").select("balance_usd").eq("email", email).execute().data
-            if u:
-                new_bal = float(u[0]["balance_usd"]) + amount
-                supabase.table("users").update({"balance_usd": new_bal}).eq("email", email).execute()
-                supabase.table("affiliate").update({"status": "Accepted"}).eq("id", aff_id).execute()
-                await update.message.reply_text(f"✅ Affiliate {aff_id} Accepted.")
+            claimed = (await execute_async(supabase.table("affiliate").update({"status": "Accepted"}).eq("id", aff_id).neq("status", "Accepted"))).data
+            if not claimed: return await update.message.reply_text(f"ℹ️ Affiliate {aff_id} already accepted.")
+            if await run_sync(ledger.credit, email, amount, "affiliate", aff_id) is None:
+                await execute_async(supabase.table("affiliate").update({"status": row["status"]}).eq("id", aff_id))
+                return await update.message.reply_text("❌ User not found.")
+            await update.message.reply_text(f"✅ Affiliate {aff_id} Accepted.")
     except: pass
 
 async def admin_aff_failed(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.effective_chat.id != config.AFFILIATE_GROUP_ID: return
-    try: supabase.table("affiliate").update({"status": "Failed"}).eq("id", int(context.args[0])).execute(); await update.message.reply_text("❌ Marked Failed.")
+    try: await execute_async(supabase.table("affiliate").update({"status": "Failed"}).eq("id", int(context.args[0]))); await update.message.reply_text("❌ Marked Failed.")
     except: pass
 
 async def admin_verify_use(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.effective_chat.id != config.AFFILIATE_GROUP_ID: return
-    try: supabase.table("VerifyPayment").update({"status": "used"}).eq("transaction_id", context.args[0]).execute(); await update.message.reply_text("✅ Marked Used.")
+    try: await execute_async(supabase.table("VerifyPayment").update({"status": "used"}).eq("transaction_id", context.args[0])); await update.message.reply_text("✅ Marked Used.")
     except: pass
 
 async def admin_order_done(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.effective_chat.id != config.K2BOOST_GROUP_ID: return
     try:
         oid = context.args[0]
-        supabase.table("WebsiteOrders").update({"status": "Completed"}).eq("id", int(oid)).execute()
+        res = await execute_async(supabase.table("WebsiteOrders").update({"status": "Completed"}).eq("id", int(oid)))
+        for o in res.data or []: status_scheduler.forget(o.get('supplier_order_id'))
         await update.message.reply_text(f"✅ Order {oid} Completed.")
     except: pass
 
+async def admin_order_resend(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_chat.id != config.K2BOOST_GROUP_ID: return
+    try:
+        oid = int(context.args[0])
+        # The journal holding the intent lives on the replica that claimed the order; it records the release when it picks the order up
+        res = await execute_async(supabase.table("WebsiteOrders").update({"status": "Pending", "resend_ok": True}).eq("id", oid).eq("status", "Submitting"))
+        change_feed.poke("WebsiteOrders")
+        await update.message.reply_text(f"🔁 Order {oid} queued for resend." if res.data else f"❌ Order {oid} is not waiting for a decision.")
+    except: pass
+
 async def admin_order_error(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.effective_chat.id != config.K2BOOST_GROUP_ID: return
     try:
         oid = context.args[0]
-        order = supabase.table("WebsiteOrders").select("*").eq("id", int(oid)).execute().data
+        order = (await execute_async(supabase.table("WebsiteOrders").select("*").eq("id", int(oid)))).data
         if order and order[0]['status'] != 'Canceled':
             o = order[0]
-            u = supabase.table("users").select("balance_usd").eq("email", o['email']).execute().data
-            if u:
-                new_bal = float(u[0]['balance_usd']) + float(o['sell_charge'])
-                supabase.table("users").update({"balance_usd": new_bal}).eq("email", o['email']).execute()
-                supabase.table("WebsiteOrders").update({"status": "Canceled"}).eq("id", int(oid)).execute()
-                await update.message.reply_text(f"❌ Order {oid} Canceled & Refunded.")
+            claimed = (await execute_async(supabase.table("WebsiteOrders").update({"status": "Canceled"}).eq("id", int(oid)).neq("status", "Canceled"))).data
+            if not claimed: return
+            status_scheduler.forget(o.get('supplier_order_id'))
+            await run_sync(ledger.credit, o['email'], float(o['sell_charge']), "refund", o['id'])
+            key = journal.key_for(o)
+            if journal.last(key): journal.failed(key, o['id'], "canceled by admin")
+            await update.message.reply_text(f"❌ Order {oid} Canceled & Refunded.")
     except: pass
 
 async def admin_ban(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.effective_chat.id != config.REPORT_GROUP_ID: return
-    if context.args: supabase.table('users').update({'is_banned': True}).eq('email', context.args[0]).execute(); await update.message.reply_text("Banned.")
+    if context.args: await execute_async(supabase.table('users').update({'is_banned': True}).eq('email', context.args[0])); await update.message.reply_text("Banned.")
 
 async def admin_swap_id(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.effective_chat.id != config.REPORT_GROUP_ID: return
     try:
         lid = context.args[0]; nid = context.args[1]
-        res = requests.post(config.SMM_API_URL, data={'key': config.SMM_API_KEY, 'action': 'services'}).json()
-        target = next((s for s in res if str(s['service']) == str(nid)), None)
+        target = await run_sync(smm_services.lookup, nid)
         if target:
-            supabase.table("services").update({"service_id": nid, "buy_price": float(target['rate'])}).eq("id", lid).execute()
+            await execute_async(supabase.table("services").update({"service_id": nid, "buy_price": float(target['rate'])}).eq("id", lid))
+            catalog.invalidate()
             await update.message.reply_text(f"✅ Swapped {lid} to {nid}")
     except: pass
 
@@ -660,13 +714,27 @@ async def admin_change_attr(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         args = context.args
         if len(args) >= 4 and args[0].isdigit(): 
-            supabase.table("services").update({args[2].lower(): " ".join(args[3:])}).gte("id", int(args[0])).lte("id", int(args[1])).execute()
+            await execute_async(supabase.table("services").update({args[2].lower(): " ".join(args[3:])}).gte("id", int(args[0])).lte("id", int(args[1])))
+            catalog.invalidate()
             await update.message.reply_text("✅ Bulk Updated.")
         elif len(args) >= 3 and args[0].isdigit(): 
-            supabase.table("services").update({args[1].lower(): " ".join(args[2:])}).eq("id", int(args[0])).execute()
+            await execute_async(supabase.table("services").update({args[1].lower(): " ".join(args[2:])}).eq("id", int(args[0])))
+            catalog.invalidate()
             await update.message.reply_text("✅ Updated.")
     except: pass
 
+async def admin_reprice(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_chat.id != config.REPORT_GROUP_ID: return
+    try:
+        # Re-applies pricing_rules to the whole catalog after a rule change (overwrites manual /Change sell prices)
+        pricing.invalidate(); catalog.invalidate()
+        rows = await run_sync(catalog.all)
+        sells = await run_sync(pricing.price_services, rows)
+        changed = [{"id": r["id"], "sell_price": new} for r, new in zip(rows, sells) if abs(float(r.get('sell_price') or 0) - new) > 1e-9]
+        await run_sync(catalog.write_prices, changed)
+        await update.message.reply_text(f"🏷️ Repriced {len(changed)} of {len(rows)} services.")
+    except Exception as e: await update.message.reply_text(f"❌ Reprice error: {e}")
+
 # 🔥 ADMIN BULK ADD
 async def admin_add_bulk(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.effective_chat.id != config.REPORT_GROUP_ID: return
@@ -689,43 +757,48 @@ async def admin_add_bulk(update: Update, context: ContextTypes.DEFAULT_TYPE):
         else:
             custom_type = raw_rest.strip(); goods_name = custom_type
             
-        await update.message.reply_text(f"🔄 Fetching from SMMGen API...\nType: {custom_type}\nGoods: {goods_name}")
+        progress = await update.message.reply_text(f"🔄 Fetching from SMMGen API...\nType: {custom_type}\nGoods: {goods_name}")
         
-        res = requests.post(config.SMM_API_URL, data={'key': config.SMM_API_KEY, 'action': 'services'}).json()
+        res = await run_sync(smm_services.covering, start_id, end_id)
         targets = [s for s in res if start_id <= int(s['service']) <= end_id]
         
         if not targets:
-            await update.message.reply_text("❌ No services found.")
+            await progress.edit_text("❌ No services found.")
             return
 
-        added_count = 0
-        for item in targets:
-            s_id = str(item['service'])
-            exists = supabase.table("services").select("id").eq("service_id", s_id).execute().data
-            if exists: continue 
-            
-            final_name = clean_service_name(item['name']) 
-            buy_price = float(item['rate'])
-            sell_price = calculate_sell_price(buy_price, final_name)
-            api_type = item.get('type', 'Default') 
-            
-            supabase.table("services").insert({
-                "service_id": s_id, 
-                "service_name": final_name, 
-                "category": item['category'], 
-                "type": custom_type, 
-                "min": int(item['min']), 
-                "max": int(item['max']), 
-                "buy_price": buy_price, 
-                "sell_price": sell_price, 
-                "use_type": api_type, 
-                "source": "smmgen", 
-                "per_quantity": 1000, 
-                "GoodsName": goods_name
-            }).execute()
-            added_count += 1
+        # One in_() per 500 ids for the existence check, then chunked bulk writes
+        existing = set()
+        for part in chunked([str(t['service']) for t in targets], 500):
+            existing |= {str(r['service_id']) for r in (await execute_async(supabase.table("services").select("service_id").in_("service_id", part))).data or []}
+        targets = [t for t in targets if str(t['service']) not in existing]
+
+        names = [clean_service_name(item['name']) for item in targets]
+        sells = (await run_sync(pricing.price_many, [float(t['rate']) for t in targets], names, [t.get('category') for t in targets], [custom_type] * len(targets))).tolist()
+        rows = [{
+            "service_id": str(item['service']), 
+            "service_name": final_name, 
+            "category": item['category'], 
+            "type": custom_type, 
+            "min": int(item['min']), 
+            "max": int(item['max']), 
+            "buy_price": float(item['rate']), 
+            "sell_price": sell_price, 
+            "use_type": item.get('type', 'Default'), 
+            "source": "smmgen", 
+            "per_quantity": 1000, 
+            "GoodsName": goods_name
+        } for item, final_name, sell_price in zip(targets, names, sells)]
+
+        added_count = 0; done = 0
+        for part in chunked(rows, config.DB_WRITE_CHUNK):
+            added_count += len(await run_sync(insert_chunked, "services", part))  # rows actually written
+            done += len(part)
+            if done < len(rows):
+                try: await progress.edit_text(f"⏳ Adding services... {added_count}/{len(rows)} (skipped {len(existing)} existing)")
+                except Exception: pass
             
-        await update.message.reply_text(f"✅ **Success!**\nAdded {added_count} services.\nType: `{custom_type}`", parse_mode='Markdown')
+        if added_count: catalog.invalidate()
+        await progress.edit_text(f"✅ **Success!**\nAdded {added_count} services, skipped {len(existing)} existing.\nType: `{custom_type}`", parse_mode='Markdown')
         
     except Exception as e:
         await update.message.reply_text(f"❌ Error: {str(e)}")
@@ -742,123 +815,17 @@ async def admin_post(update: Update, context: ContextTypes.DEFAULT_TYPE):
         print(f"❌ Error getting bot info: {e}")
         return
 
-    svcs = supabase.table('services').select("*").neq('type', 'Demo').range(0, 2000).order('id', desc=False).execute().data
-    if not svcs:
+    busy = "⏳ The previous /post is still updating the channel. Try again after its ✅ All Done report."
+    if channel_publisher.busy():
+        await update.message.reply_text(busy)
+        return
+    await update.message.reply_text("📢 Rendering catalog...")
+    # Streams the catalog page by page; only changed chunks are sent/edited, paced by a background task
+    plan = await channel_publisher.publish(context.bot, render_chunks(stream_services(), bot_username), update.effective_chat.id)
+    if plan is None:
+        await update.message.reply_text(busy)
+        return
+    if not plan['chunks']:
         await update.message.reply_text("❌ No services found.")
         return
-
-    cats = {}
-    for s in svcs: cats.setdefault(s['category'], []).append(s)
-    
-    await update.message.reply_text(f"📢 Processing {len(svcs)} services...\n⏳ Delay: 3s per message")
-    
-    for c, items in cats.items():
-        chunks = []
-        current_chunk = []
-        current_len = 0
-        limit = 3800
-        
-        first = items[0]
-        sType = first.get('type', '')
-        sGoods = first.get('GoodsName', '')
-        
-        sub_header = ""
-        if sType and sType != 'Default':
-            sub_header += f"Type = {html.escape(sType)}"
-        
-        if sGoods:
-            if sub_header: sub_header += f" | {html.escape(sGoods)}"
-            else: sub_header += f"Goods = {html.escape(sGoods)}"
-            
-        header = f"📂 <b>{html.escape(c)}</b>\n"
-        if sub_header:
-            header += f"{sub_header}\n"
-        header += "➖➖➖➖➖➖➖➖➖➖\n\n"
-        
-        footer = "➖➖➖➖➖➖➖➖➖➖\n👇 Click blue text to Order"
-        
-        for s in items:
-            raw_name = s['service_name']
-            clean_name = raw_name.replace('\xa0', ' ').replace('\u200b', '')
-            normalized_name = unicodedata.normalize('NFKD', clean_name).encode('ascii', 'ignore').decode('utf-8').lower()
-            
-            if "no refill" in normalized_name: 
-                icon = "🚫"
-            elif any(x in normalized_name for x in ["refill", "lifetime", "guaranteed", "auto"]): 
-                icon = "♻️"
-            else: 
-                icon = "⚡"
-            
-            line = f"{icon} <a href='https://t.me/{bot_username}?start=order_{s['id']}'>ID:{s['id']} - {html.escape(s['service_name'])}</a>\n\n"
-            
-            if current_len + len(line) > limit:
-                chunks.append(current_chunk)
-                current_chunk = []
-                current_len = 0
-            
-            current_chunk.append(s)
-            current_len += len(line)
-            
-        if current_chunk: chunks.append(current_chunk)
-        
-        for batch in chunks:
-            msg_text = header
-            for s in batch:
-                # Re-apply logic for batch loop
-                raw_name = s['service_name']
-                clean_name = raw_name.replace('\xa0', ' ').replace('\u200b', '')
-                normalized_name = unicodedata.normalize('NFKD', clean_name).encode('ascii', 'ignore').decode('utf-8').lower()
-                
-                if "no refill" in normalized_name: icon = "🚫"
-                elif any(x in normalized_name for x in ["refill", "lifetime", "guaranteed", "auto"]): icon = "♻️"
-                else: icon = "⚡"
-                
-                msg_text += f"{icon} <a href='https://t.me/{bot_username}?start=order_{s['id']}'>ID:{s['id']} - {html.escape(s['service_name'])}</a>\n\n"
-            
-            msg_text += footer
-            
-            first_svc_batch = batch[0]
-            msg_id = first_svc_batch.get('channel_msg_id')
-            
-            try:
-                sent_msg = None
-                
-                # Case 1: ID ရှိရင် Edit လုပ်မယ်
-                if msg_id and msg_id != 0:
-                    try:
-                        await context.bot.edit_message_text(
-                            chat_id=config.CHANNEL_ID, 
-                            message_id=msg_id, 
-                            text=msg_text, 
-                            parse_mode='HTML', 
-                            disable_web_page_preview=True
-                        )
-                        print(f"✅ Edited Msg ID {msg_id}...")
-                    except Exception as e:
-                        err = str(e).lower()
-                        # စာသားမပြောင်းလဲရင် Error တက်တတ်တယ် (အဲ့ဒါဆို ဘာမှမလုပ်ဘူး)
-                        if "message is not modified" in err:
-                            print(f"🔹 No changes for ID {msg_id}")
-                        # Message ဖျက်ခံလိုက်ရရင်တော့ အသစ်ပြန်တင်မယ်
-                        elif "message to edit not found" in err or "message can't be edited" in err:
-                            print(f"⚠️ Msg Deleted. Sending New...")
-                            sent_msg = await context.bot.send_message(chat_id=config.CHANNEL_ID, text=msg_text, parse_mode='HTML', disable_web_page_preview=True)
-                        else:
-                            print(f"❌ Edit Error: {e}")
-
-                # Case 2: ID မရှိရင် အသစ်တင်မယ်
-                else:
-                    sent_msg = await context.bot.send_message(chat_id=config.CHANNEL_ID, text=msg_text, parse_mode='HTML', disable_web_page_preview=True)
-                    print(f"✅ Sent New Msg...")
-
-                # အသစ်တင်လိုက်ရမှသာ Database မှာ ID လိုက်ပြောင်းမယ်
-                if sent_msg:
-                    for s in batch:
-                        supabase.table('services').update({'channel_msg_id': sent_msg.message_id}).eq('id', s['id']).execute()
-            
-            except Exception as e:
-                print(f"❌ CRITICAL POST ERROR: {e}")
-            
-            time.sleep(3) 
-                
-    await update.message.reply_text("✅ All Done.")
+    await update.message.reply_text(f"🧮 {plan['chunks']} chunks · {plan['queued']} to update · {plan['unchanged']} unchanged · {plan['removed']} to remove\n⏳ {config.CHANNEL_POST_INTERVAL:g}s per message")
@@ -1,63 +1,43 @@
 import time
-import requests
 import config
 import json
 import html
-import re
 import traceback
-from db import supabase
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from db import supabase, chunked, fetch_all
+import ledger
+from status_schedule import status_scheduler
+from journal import journal, OPEN_STATES
+from outbox import outbox
+from watermark import Watermark
+from leases import order_shards, status_shards, shard_buckets
+from smmgen import smm, never_sent
+from smm_services import smm_services
+from catalog import catalog
 from datetime import datetime
 from zoneinfo import ZoneInfo
-from utils import parse_smm_support_response, clean_service_name, calculate_sell_price # 🔥 Import Here
+from utils import parse_smm_support_response, clean_service_name, paginate_blocks # 🔥 Import Here
+from pricing import pricing
 
-# 🔥 SAFE LOGGING (HTML)
+# 🔥 SAFE LOGGING (HTML) - queued, paced and retried by the outbox sender
 def send_log_retry(chat_id, text):
-    if not chat_id or str(chat_id) == "0": return
-    for attempt in range(3):
-        try:
-            url = f"https://api.telegram.org/bot{config.BOT_TOKEN}/sendMessage"
-            payload = {
-                "chat_id": chat_id,
-                "text": text,
-                "parse_mode": "HTML",
-                "disable_web_page_preview": True
-            }
-            res = requests.post(url, json=payload, timeout=10)
-            if res.status_code == 200: return
-        except: pass
-        time.sleep(2)
-
-# 🧹 HELPER: Name Cleaning
-def clean_service_name(raw_name):
-    name = re.sub(r"\s*~\s*Max\s*[\d\.]+[KkMmBb]?\s*", "", raw_name, flags=re.IGNORECASE)
-    name = re.sub(r"\s*~\s*[\d\.]+[KkMm]?/days?\s*", "", name, flags=re.IGNORECASE)
-    return name.strip()
-
-# 💰 HELPER: Price Calculation
-def calculate_sell_price(buy_price, service_name):
-    if 'view' in service_name.lower():
-        return round(buy_price * 3.0, 4)
-    return round(buy_price * 1.4, 4)
+    outbox.send(chat_id, text)
 
 # 🛠️ HELPER: Logic Helpers
 def find_service_for_order(order):
     try:
-        svc_name = order.get("service")
-        if svc_name:
-            r = supabase.table("services").select("*").eq("service_name", svc_name).execute()
-            if r.data: return r.data[0]
-            rows = supabase.table("services").select("*").ilike("service_name", f"%{svc_name}%").limit(1).execute()
-            if rows.data: return rows.data[0]
+        lid = order.get("service_local_id")
+        if lid: return catalog.get_many([lid]).get(str(lid))
+        # Rows the backfill (sql/005) couldn't match
+        return catalog.by_name(order.get("service")) or catalog.by_service_id(order.get("supplier_service_id"))
     except: pass
     return None
 
-def update_user_balance(email, amount):
-    try:
-        user = supabase.table("users").select("balance_usd").eq("email", email).execute().data
-        if user:
-            new_bal = float(user[0]['balance_usd']) + amount
-            supabase.table("users").update({"balance_usd": new_bal}).eq("email", email).execute()
-    except: pass
+def update_user_balance(email, amount, reason="adjust", ref=None):
+    # Atomic increment + ledger row in one round trip (see ledger.py)
+    try: return ledger.credit(email, amount, reason, ref)
+    except Exception as e: print(f"⚠️ Balance update failed for {email} ({reason} {amount}): {e}")
 
 def adjust_service_qty_on_status_change(order, old_status, new_status):
     try:
@@ -73,6 +53,17 @@ def adjust_service_qty_on_status_change(order, old_status, new_status):
         if not svc: return
         svc_id = svc.get("id")
 
+        def record_sale(kind, qty_delta, spend_delta=0, refund=0):
+            # Append-only; the sales_rollup job folds it into the counters (sql/006_sales_rollups.sql)
+            supabase.table("sales_events").insert({"order_id": order.get("id"), "service_local_id": svc_id, "email": email, "kind": kind,
+                                                   "qty_delta": qty_delta, "spend_delta": round(spend_delta, 6), "refund": round(refund, 6)}).execute()
+
+        def spend_after(delta):
+            # Only decides bonus eligibility; total_spend itself is updated by the rollup
+            if not email: return None
+            u = supabase.table("users").select("total_spend").eq("email", email).execute().data
+            return float(u[0].get("total_spend") or 0) + delta if u else None
+
         def notify_supplier(title, refund_amount=0, spend_amount=0, done_qty=0):
             msg = (
                 f"📦 <b>{title}</b>\n"
@@ -90,238 +81,382 @@ def adjust_service_qty_on_status_change(order, old_status, new_status):
             )
             send_log_retry(config.SUPPLIER_GROUP_ID, msg)
 
-        def handle_referral_and_bonus(amount, add=True):
-            user_data = supabase.table("users").select("ref_owner_id", "total_spend").eq("email", email).execute().data
-            if not user_data: return
-            user_info = user_data[0]
-            ref_owner = user_info.get("ref_owner_id")
-            
-            # Referral 4%
-            if ref_owner:
-                delta = amount * 0.04
-                if not add: delta = -delta
-                current_withdraw = supabase.table("users").select("withdrawable_balance").eq("id", ref_owner).execute().data[0].get("withdrawable_balance") or 0
-                supabase.table("users").update({"withdrawable_balance": current_withdraw + delta}).eq("id", ref_owner).execute()
-                send_log_retry(config.AFFILIATE_GROUP_ID, f"💰 Referral Owner reward {'added' if add else 'deducted'}: ${delta:.4f} for ref_owner_id {ref_owner}")
-            
-            # Bonus 1% if spend > 10
-            total_spend = float(user_info.get("total_spend") or 0)
-            if total_spend > 10:
-                bonus = amount * 0.01
-                if not add: bonus = -bonus
-                update_user_balance(email, bonus)
-                send_log_retry(config.AFFILIATE_GROUP_ID, f"🎁 User bonus {'added' if add else 'deducted'}: ${bonus:.4f} for {email}")
+        def handle_referral_and_bonus(amount, add=True, spend_after=None):
+            # One insert; the rewards job applies accruals in bulk (sql/004_reward_accruals.sql)
+            if not email or not amount: return
+            sign = 1 if add else -1
+            rows = [{"kind": "referral", "email": email, "amount": round(sign * amount * 0.04, 6), "order_id": order.get("id")}]  # Referral 4%
+            if spend_after is not None and spend_after > 10:  # Bonus 1% if spend > 10
+                rows.append({"kind": "bonus", "email": email, "amount": round(sign * amount * 0.01, 6), "order_id": order.get("id")})
+            supabase.table("reward_accruals").insert(rows).execute()
 
         # LOGIC
         if new == "completed" and old != "completed":
-            cur_qty = int(svc.get("total_sold_qty") or 0)
-            supabase.table("services").update({"total_sold_qty": cur_qty + qty}).eq("id", svc_id).execute()
-            if email and sell_price:
-                user = supabase.table("users").select("total_spend").eq("email", email).execute().data
-                if user:
-                    total_spend = float(user[0].get("total_spend") or 0) + sell_price
-                    supabase.table("users").update({"total_spend": total_spend}).eq("email", email).execute()
-            handle_referral_and_bonus(sell_price, add=True)
+            record_sale("completed", qty, sell_price)
+            handle_referral_and_bonus(sell_price, add=True, spend_after=spend_after(sell_price) if sell_price else None)
             notify_supplier("✅ Completed Order", refund_amount=0, spend_amount=sell_price, done_qty=qty)
 
         elif old == "completed" and new in ("partial", "canceled", "cancelled"):
-            cur_qty = int(svc.get("total_sold_qty") or 0)
-            supabase.table("services").update({"total_sold_qty": max(0, cur_qty - qty)}).eq("id", svc_id).execute()
             if email and qty and sell_price:
                 refund_amount = (remain / qty) * sell_price if remain else sell_price
-                user = supabase.table("users").select("total_spend").eq("email", email).execute().data
-                if user:
-                    total_spend = float(user[0].get("total_spend") or 0) - refund_amount
-                    supabase.table("users").update({"total_spend": max(0, total_spend)}).eq("email", email).execute()
-                update_user_balance(email, refund_amount)
-                supabase.table("WebsiteOrders").update({"refund_amount": refund_amount, "status": "Refunded"}).eq("id", order.get("id")).execute()
-                handle_referral_and_bonus(refund_amount, add=False)
+                record_sale("refunded", -qty, -refund_amount, refund_amount)
+                update_user_balance(email, refund_amount, "refund", order.get("id"))
+                order["refund_amount"] = refund_amount  # persisted with the status write in the batch loop
+                handle_referral_and_bonus(refund_amount, add=False, spend_after=spend_after(-refund_amount))
                 notify_supplier("♻️ Completed → Refunded", refund_amount=refund_amount, done_qty=0)
                 send_log_retry(config.AFFILIATE_GROUP_ID, f"🔁 Refunded ${refund_amount:.4f} to {email} for order {order.get('id')} (remain {remain})")
+            else:
+                record_sale("refunded", -qty)
 
         elif new in ("partial", "canceled", "cancelled") and old not in ("completed", "partial", "canceled", "cancelled"):
             done_qty = max(0, qty - remain)
-            cur_qty = int(svc.get("total_sold_qty") or 0)
-            supabase.table("services").update({"total_sold_qty": cur_qty + done_qty}).eq("id", svc_id).execute()
             if qty > 0 and sell_price > 0:
                 refund_amount = (sell_price / qty) * remain
                 spend_amount = sell_price - refund_amount
-                user = supabase.table("users").select("total_spend").eq("email", email).execute().data
-                if user:
-                    total_spend = float(user[0].get("total_spend") or 0) + spend_amount
-                    supabase.table("users").update({"total_spend": total_spend}).eq("email", email).execute()
-                update_user_balance(email, refund_amount)
-                supabase.table("WebsiteOrders").update({"refund_amount": refund_amount, "status": "Refunded"}).eq("id", order.get("id")).execute()
+                record_sale("partial", done_qty, spend_amount, refund_amount)
+                update_user_balance(email, refund_amount, "refund", order.get("id"))
+                order["refund_amount"] = refund_amount  # persisted with the status write in the batch loop
                 notify_supplier("💸 Partial/Canceled Order", refund_amount=refund_amount, spend_amount=spend_amount, done_qty=done_qty)
                 send_log_retry(config.AFFILIATE_GROUP_ID, f"💸 {email} refunded ${refund_amount:.4f} for {service_name} (remain {remain})")
+            else:
+                record_sale("partial", done_qty)
     
     except Exception as e:
         print("adjust_service_qty_on_status_change error:", e)
         traceback.print_exc()
 
+# 📊 SALES ROLLUP
+def rollup_sales_once():
+    # Drain the backlog in batches; each call is one transaction in Postgres
+    while (supabase.rpc("rollup_sales_events", {"p_limit": config.SALES_ROLLUP_BATCH}).execute().data or 0) >= config.SALES_ROLLUP_BATCH: pass
+
+# 🎁 REWARD SETTLEMENT
+def settle_rewards_once():
+    rows = supabase.rpc("settle_reward_accruals", {"p_limit": config.REWARD_SETTLE_BATCH}).execute().data or []
+    if not rows: return
+    lines = []
+    for r in sorted(rows, key=lambda r: (r["kind"], -abs(float(r["amount"]))))[:40]:
+        amt = float(r["amount"])
+        who = f"ref_owner_id {r['beneficiary']}" if r["kind"] == "referral" else r["beneficiary"]
+        icon = "💰" if r["kind"] == "referral" else "🎁"
+        lines.append(f"{icon} {'+' if amt >= 0 else '-'}${abs(amt):.4f} → {html.escape(who)} ({r['events']} orders)")
+    if len(rows) > 40: lines.append(f"… and {len(rows) - 40} more")
+    send_log_retry(config.AFFILIATE_GROUP_ID, "🧾 <b>Rewards Settled</b>\n\n" + "\n".join(lines))
+
 # 1. ORDER PROCESSOR
-def process_pending_orders_loop():
-    while True:
-        try:
-            orders = supabase.table("WebsiteOrders").select("*").eq("status", "Pending").execute().data or []
-            for o in orders:
-                try:
-                    sup_oid = str(o.get("supplier_order_id") or "")
-                    if sup_oid and sup_oid != "0": continue
-                    supplier = (o.get("supplier_name") or "").lower().strip()
-                    try:
-                        sell_usd = float(o.get('sell_charge', 0))
-                        mmk_price = sell_usd * config.USD_TO_MMK
-                    except: sell_usd = 0.0; mmk_price = 0.0
-
-                    if supplier == "smmgen":
-                        payload = {'key': config.SMM_API_KEY, 'action': 'add', 'service': o['supplier_service_id'], 'link': o['link'], 'quantity': o['quantity']}
-                        if o.get('comments'): payload['comments'] = "\n".join(o['comments'])
-                        res = requests.post(config.SMM_API_URL, data=payload, timeout=30).json()
-                        if 'order' in res:
-                            sup_id = str(res['order'])
-                            supabase.table("WebsiteOrders").update({"status": "Processing", "supplier_order_id": sup_id}).eq("id", o["id"]).execute()
-                            msg = f"🚀 <b>New Order Sent to SMMGEN</b>\n\n🆔 <b>{o['id']}</b>\n📦 Service: {html.escape(o.get('service',''))}\n🔢 Quantity: {o['quantity']}\n🔗 Link: {html.escape(o.get('link',''))}\n💰 Sell Charge (USD): {sell_usd}\n💵 Sell Charge (MMK): {mmk_price:,.0f}\n📧 Email: {o['email']}\n🧾 Supplier Order ID: {sup_id}\n✅ Status: Processing"
-                            send_log_retry(config.SUPPLIER_GROUP_ID, msg)
-                        elif 'error' in res:
-                            update_user_balance(o['email'], sell_usd)
-                            supabase.table("WebsiteOrders").update({"status": "Canceled"}).eq("id", o["id"]).execute()
-                            send_log_retry(config.K2BOOST_GROUP_ID, f"❌ <b>Order {o['id']} Failed & Refunded</b>\nReason: {res['error']}")
-
-                    elif supplier == "k2boost":
-                        supabase.table("WebsiteOrders").update({"status": "Processing"}).eq("id", o["id"]).execute()
-                        msg = f"⚡️ <b>New Order to K2BOOST</b>\n\n🆔 <b>{o['id']}</b>\n📧 Email: {o['email']}\n📦 Service: {html.escape(o.get('service',''))}\n🔢 Quantity: {o['quantity']}\n🔗 Link: {html.escape(o.get('link',''))}\n📆 Day: {o.get('day', 1)}\n⏳ Remain: {o.get('quantity')}\n💰 Sell Charge (USD): {sell_usd}\n💵 Sell Charge (MMK): {mmk_price:,.0f}\n🏷 Supplier: k2boost\n🕒 Created: {o.get('created_at', 'Now')}\n💬 Used Type: {html.escape(str(o.get('UsedType', 'Default')))}"
-                        send_log_retry(config.K2BOOST_GROUP_ID, msg)
-                except Exception as inner_e: print(f"⚠️ Error on Order {o.get('id')}: {inner_e}")
-        except Exception as e: print(f"🔥 Critical Order Loop Error: {e}")
-        time.sleep(5)
+SUBMIT_POOL = ThreadPoolExecutor(max_workers=config.SUBMIT_WORKERS, thread_name_prefix="submit")
+SUPPLIER_SLOTS = {name: threading.BoundedSemaphore(n) for name, n in config.SUPPLIER_CONCURRENCY.items()}
 
-# 2. STATUS CHECKER (Uses New Logic)
-def smmgen_status_batch_loop():
-    while True:
-        try:
-            all_smm = supabase.table("WebsiteOrders").select("*").eq("supplier_name","smmgen").not_.in_("status", ["Completed", "Canceled", "Refunded", "Partial", "cancelled"]).not_.is_("supplier_order_id", None).execute().data or []
-            s_ids = [str(o['supplier_order_id']) for o in all_smm if str(o['supplier_order_id']).isdigit()]
-            if not s_ids: time.sleep(60); continue
-            
-            for i in range(0, len(s_ids), 100):
-                batch = ",".join(s_ids[i:i + 100])
-                try:
-                    res = requests.post(config.SMM_API_URL, data={"key": config.SMM_API_KEY, "action": "status", "orders": batch}, timeout=30).json()
-                    for sup_id, info in res.items():
-                        if isinstance(info, dict) and "status" in info:
-                            new_s = info["status"]
-                            local_order = next((x for x in all_smm if str(x['supplier_order_id']) == str(sup_id)), None)
-                            
-                            if local_order and local_order['status'].lower() != new_s.lower():
-                                remains = int(info.get('remains', 0))
-                                # Update remain first so logic can use it
-                                supabase.table("WebsiteOrders").update({"remain": remains}).eq("supplier_order_id", sup_id).execute()
-                                
-                                # 🔥 CALL THE LOGIC FUNCTION
-                                local_order['remain'] = remains # Update local obj for function
-                                adjust_service_qty_on_status_change(local_order, local_order['status'], new_s)
-                                
-                                # Final Status Update in DB
-                                supabase.table("WebsiteOrders").update({"status": new_s}).eq("supplier_order_id", sup_id).execute()
-                except: pass
-                time.sleep(2)
-        except: pass
-        time.sleep(60)
+def claim_pending_orders(limit):
+    # Conditional Pending -> Submitting update: a row is returned to exactly one claimer, across workers and replicas
+    q = order_shards.filter(supabase.table("WebsiteOrders").select("id").eq("status", "Pending"))
+    if q is None: return []
+    # supplier_name is stored lower/trimmed (trigger in sql/015_supplier_name_normalized.sql)
+    pending = q.in_("supplier_name", list(SUPPLIER_SLOTS)).or_("supplier_order_id.is.null,supplier_order_id.eq.0").order("id").limit(limit).execute().data or []
+    if not pending: return []
+    return supabase.table("WebsiteOrders").update({"status": "Submitting", "claimed_by": config.REPLICA_INDEX}).in_("id", [o["id"] for o in pending]).eq("status", "Pending").execute().data or []
 
-# 3. TRANSACTION POLLER
-def poll_transactions():
-    processed_tx = set()
-    while True:
-        try:
-            txs = supabase.table("transactions").select("*").eq("status", "Pending").execute().data or []
-            for tx in txs:
-                tx_id = tx['id']
-                if tx_id in processed_tx: continue
-                verify = supabase.table("VerifyPayment").select("*").eq("transaction_id", tx['transaction_id']).eq("status", "unused").execute().data
-                match = None
-                if verify:
-                    for v in verify:
-                        if abs(float(v["amount_usd"]) - float(tx["amount"])) < 0.01: match = v; break
-                mmk_amt = float(tx["amount"]) * config.USD_TO_MMK
-                if match:
-                    update_user_balance(tx['email'], float(tx["amount"]))
-                    supabase.table("VerifyPayment").update({"status": "used"}).eq("transaction_id", tx['transaction_id']).execute()
-                    supabase.table("transactions").update({"status": "Accepted"}).eq("id", tx_id).execute()
-                    msg = f"✅ <b>Auto Top-up Completed</b>\n\n👤 User: {tx['email']}\n💳 Method: {tx['method']}\n💰 Amount USD: {tx['amount']}\n🇲🇲 Amount MMK: {mmk_amt:,.0f}\n🧾 Transaction ID: {tx['transaction_id']}"
-                    send_log_retry(config.AFFILIATE_GROUP_ID, msg)
+def release_order(order_id):
+    supabase.table("WebsiteOrders").update({"status": "Pending"}).eq("id", order_id).eq("status", "Submitting").execute()
+
+def mark_order_sent(o, sup_id):
+    supabase.table("WebsiteOrders").update({"status": "Processing", "supplier_order_id": sup_id}).eq("id", o["id"]).execute()
+    status_scheduler.track({**o, "status": "Processing", "supplier_order_id": sup_id})
+
+def hold_uncertain_order(o, err):
+    # Leave it claimed (Submitting) with an open journal intent until an admin decides
+    print(f"⚠️ Order {o['id']} outcome unknown: {err}")
+    journal.intent(journal.key_for(o), o["id"], alerted=True)
+    send_log_retry(config.K2BOOST_GROUP_ID, f"⚠️ <b>Order {o['id']} submit outcome unknown</b>\nReason: {html.escape(str(err))}\n\nCheck SMMGen, then:\n/Resend {o['id']} - submit again\n/Error {o['id']} - cancel & refund")
+
+def reconcile_journal_entry(rec):
+    key, oid = rec["key"], rec["order_id"]
+    if rec["state"] == "sent":
+        # Supplier accepted before the crash; finish the DB write instead of resending
+        row = supabase.table("WebsiteOrders").select("*").eq("id", oid).execute().data
+        if row and row[0]["status"] in ("Pending", "Submitting"): mark_order_sent(row[0], rec["supplier_order_id"])
+        journal.done(key, oid)
+    elif rec["state"] == "intent" and not rec.get("alerted"):
+        supabase.table("WebsiteOrders").update({"status": "Submitting"}).eq("id", oid).eq("status", "Pending").execute()
+        hold_uncertain_order({"id": oid}, "bot stopped during submit")
+
+def replay_submit_journal():
+    for rec in journal.unresolved():
+        try: reconcile_journal_entry(rec)
+        except Exception as e: print(f"⚠️ Journal replay error {rec.get('key')}: {e}")
+    journal.compact()
+    if config.RELEASE_ORPHAN_CLAIMS:
+        # Claimed but crashed before the intent record: the supplier was never called. Only our own
+        # claims can be checked against this journal (pre-claimed_by rows: those in our own shard)
+        legacy = "claimed_by.is.null" if config.REPLICA_COUNT == 1 else f"and(claimed_by.is.null,shard_bucket.in.({','.join(map(str, shard_buckets([config.REPLICA_INDEX])))}))"
+        stuck = supabase.table("WebsiteOrders").select("id").eq("status", "Submitting").or_(f"claimed_by.eq.{config.REPLICA_INDEX},{legacy}").execute().data or []
+        for r in stuck:
+            last = journal.last(journal.key_for(r))
+            if not last or last["state"] not in OPEN_STATES: release_order(r["id"])
+
+def submit_order(o):
+    supplier = (o.get("supplier_name") or "").lower().strip()
+    try:
+        with SUPPLIER_SLOTS[supplier]:
+            try:
+                sell_usd = float(o.get('sell_charge', 0))
+                mmk_price = sell_usd * config.USD_TO_MMK
+            except: sell_usd = 0.0; mmk_price = 0.0
+
+            if supplier == "smmgen":
+                key = journal.key_for(o)
+                prev = journal.last(key)
+                if prev and prev["state"] in OPEN_STATES and prev.get("alerted") and o.get("resend_ok"):
+                    journal.released(key, o["id"])  # admin chose /Resend (possibly on another replica)
+                elif prev and prev["state"] in OPEN_STATES:
+                    return reconcile_journal_entry(prev)  # may already be placed -> never resend
+                if o.get("resend_ok"):
+                    # One /Resend buys one attempt; a new unknown outcome needs a new decision
+                    supabase.table("WebsiteOrders").update({"resend_ok": False}).eq("id", o["id"]).execute()
+                
+                journal.intent(key, o["id"])
+                try: res = smm.add(o['supplier_service_id'], o['link'], o['quantity'], comments=o.get('comments'), timeout=30)
+                except Exception as e:
+                    if never_sent(e):
+                        journal.failed(key, o["id"], e)  # never reached SMMGen: back to the queue
+                        raise
+                    # Read timeout / dropped connection: SMMGen may have accepted it
+                    hold_uncertain_order(o, e)
+                    return
+                
+                if 'order' in res:
+                    sup_id = str(res['order'])
+                    journal.sent(key, o["id"], sup_id)
+                    mark_order_sent(o, sup_id)
+                    journal.done(key, o["id"])
+                    msg = f"🚀 <b>New Order Sent to SMMGEN</b>\n\n🆔 <b>{o['id']}</b>\n📦 Service: {html.escape(o.get('service',''))}\n🔢 Quantity: {o['quantity']}\n🔗 Link: {html.escape(o.get('link',''))}\n💰 Sell Charge (USD): {sell_usd}\n💵 Sell Charge (MMK): {mmk_price:,.0f}\n📧 Email: {o['email']}\n🧾 Supplier Order ID: {sup_id}\n✅ Status: Processing"
+                    send_log_retry(config.SUPPLIER_GROUP_ID, msg)
+                elif 'error' in res:
+                    journal.failed(key, o["id"], res['error'])
+                    update_user_balance(o['email'], sell_usd, "refund", o["id"])
+                    supabase.table("WebsiteOrders").update({"status": "Canceled"}).eq("id", o["id"]).execute()
+                    send_log_retry(config.K2BOOST_GROUP_ID, f"❌ <b>Order {o['id']} Failed & Refunded</b>\nReason: {res['error']}")
                 else:
-                    supabase.table("transactions").update({"status": "Processing"}).eq("id", tx_id).execute()
-                    msg = f"🆕 <b>New Unverified Transaction</b>\n\n🆔 ID: {tx_id}\n📧 Email: {tx['email']}\n💳 Method: {tx['method']}\n💵 Amount USD: {tx['amount']}\n🇲🇲 Amount MMK: {mmk_amt:,.0f}\n🧾 Transaction ID: {tx.get('transaction_id', 'N/A')}\n\n🛠 <b>Admin Commands:</b>\n/Yes {tx_id}\n/No {tx_id}"
-                    send_log_retry(config.AFFILIATE_GROUP_ID, msg)
-                processed_tx.add(tx_id)
+                    journal.failed(key, o["id"], res)
+                    release_order(o["id"])
+
+            elif supplier == "k2boost":
+                supabase.table("WebsiteOrders").update({"status": "Processing"}).eq("id", o["id"]).execute()
+                msg = f"⚡️ <b>New Order to K2BOOST</b>\n\n🆔 <b>{o['id']}</b>\n📧 Email: {o['email']}\n📦 Service: {html.escape(o.get('service',''))}\n🔢 Quantity: {o['quantity']}\n🔗 Link: {html.escape(o.get('link',''))}\n📆 Day: {o.get('day', 1)}\n⏳ Remain: {o.get('quantity')}\n💰 Sell Charge (USD): {sell_usd}\n💵 Sell Charge (MMK): {mmk_price:,.0f}\n🏷 Supplier: k2boost\n🕒 Created: {o.get('created_at', 'Now')}\n💬 Used Type: {html.escape(str(o.get('UsedType', 'Default')))}"
+                send_log_retry(config.K2BOOST_GROUP_ID, msg)
+    except Exception as inner_e:
+        print(f"⚠️ Error on Order {o.get('id')}: {inner_e}")
+        try: release_order(o["id"])  # back to the queue for another attempt
         except: pass
-        time.sleep(10)
+
+SUBMIT_INFLIGHT = set()
+
+def process_pending_orders_once():
+    # Claims fill the submit pool; returns the delay until the next check (sooner while submits are running)
+    SUBMIT_INFLIGHT.difference_update({f for f in SUBMIT_INFLIGHT if f.done()})
+    room = config.SUBMIT_QUEUE - len(SUBMIT_INFLIGHT)
+    if room > 0:
+        for o in claim_pending_orders(room): SUBMIT_INFLIGHT.add(SUBMIT_POOL.submit(submit_order, o))
+    return 1 if SUBMIT_INFLIGHT else None
+
+# 2. STATUS CHECKER (Uses New Logic)
+SMM_FINAL_STATUSES = ["Completed", "Canceled", "Refunded", "Partial", "cancelled"]
+
+def sync_open_smm_orders():
+    # Only orders in the status shards this replica holds; the rest are forgotten below
+    rows = [] if not status_shards.owned() else fetch_all(lambda: status_shards.filter(supabase.table("WebsiteOrders").select("*")).eq("supplier_name","smmgen").not_.in_("status", SMM_FINAL_STATUSES).not_.is_("supplier_order_id", None).order("id"))
+    open_ids = set()
+    for o in rows:
+        status_scheduler.track(o)
+        open_ids.add(str(o['supplier_order_id']))
+    # Closed elsewhere (admin commands / website) -> stop polling
+    for sup_id in status_scheduler.known() - open_ids: status_scheduler.forget(sup_id)
+
+STATUS_STATE = {"last_sync": 0.0, "shards": None}
+SMM_FINAL_LOWER = {x.lower() for x in SMM_FINAL_STATUSES}
+
+def poll_smmgen_status_once():
+    # Full table scan only every STATUS_RESYNC_INTERVAL (or when our shards change); new orders are tracked on submit
+    shards = status_shards.owned()
+    if shards != STATUS_STATE["shards"] or time.time() - STATUS_STATE["last_sync"] > config.STATUS_RESYNC_INTERVAL:
+        sync_open_smm_orders(); STATUS_STATE["last_sync"] = time.time(); STATUS_STATE["shards"] = shards
+    
+    due = []
+    for sup_id in status_scheduler.due():
+        o = status_scheduler.order(sup_id)
+        if o and not status_shards.owns(o["id"]): status_scheduler.forget(sup_id)  # handed to another replica
+        else: due.append(sup_id)
+
+    # due() took these ids off the heap; any not rescheduled below (errors, skipped batches) go back with backoff
+    try:
+        for batch in chunked(due, 100):
+            try: res = smm.status_many(batch, timeout=30)
+            except Exception as e: res = {}; print(f"⚠️ Status batch error: {e}")
+            if not isinstance(res, dict): res = {}
+
+            # Decide on fresh rows, not the tracked copy: /Error, /Done or the website may have closed an order since the last resync
+            ids = [o["id"] for o in map(status_scheduler.order, batch) if o]
+            try: fresh = {str(o["id"]): o for o in (supabase.table("WebsiteOrders").select("*").in_("id", ids).execute().data or [])} if ids else {}
+            except Exception as e:
+                print(f"⚠️ Status re-read error: {e}")
+                continue
+
+            moves = []
+            for sup_id in batch:
+                info = res.get(sup_id)
+                tracked = status_scheduler.order(sup_id)
+                local_order = fresh.get(str(tracked["id"])) if tracked else None
+                if tracked and (not local_order or (local_order.get("status") or "").lower() in SMM_FINAL_LOWER):
+                    status_scheduler.forget(sup_id)  # closed elsewhere
+                    continue
+                if not local_order or not (isinstance(info, dict) and "status" in info):
+                    status_scheduler.observe(sup_id)  # every due id must be rescheduled
+                    continue
+                status_scheduler.track(local_order)
+                new_s = info["status"]
+                remains = int(info.get('remains', 0))
+                if local_order['status'].lower() != new_s.lower(): moves.append((local_order, local_order['status'], new_s, remains))
+                status_scheduler.observe(sup_id, new_s, remains)
+                if new_s.lower() in SMM_FINAL_LOWER: status_scheduler.forget(sup_id)
+
+            # One combined status + remain write per batch, conditional on the status we read: only the
+            # transitions this call claims get their refund / sale / reward side effects
+            if moves:
+                rows = [{"id": o["id"], "old_status": old, "status": new_s, "remain": remains} for o, old, new_s, remains in moves]
+                try: claimed = {r["id"] for r in supabase.rpc("apply_order_status", {"p_rows": rows}).execute().data or []}
+                except Exception as e: claimed = set(); print(f"❌ Status write error: {e}")
+                refunds = []
+                for o, old, new_s, remains in moves:
+                    if o["id"] not in claimed: continue  # changed under us; re-read next time it's due
+                    o['remain'] = remains; o.pop('refund_amount', None)
+                    try: adjust_service_qty_on_status_change(o, old, new_s)
+                    except Exception as e: print(f"⚠️ Status change error {o['id']}: {e}")
+                    if o.get('refund_amount') is not None: refunds.append({"id": o["id"], "old_status": new_s, "status": new_s, "refund_amount": o['refund_amount']})
+                if refunds:
+                    try: supabase.rpc("apply_order_status", {"p_rows": refunds}).execute()
+                    except Exception as e: print(f"❌ Refund amount write error: {e}")
+            time.sleep(config.SMM_STATUS_BATCH_PAUSE)
+    finally:
+        status_scheduler.requeue(due)
+
+# 3. TRANSACTION POLLER
+def verify_transactions(txs):
+    # One VerifyPayment read for the whole page, then a hash join on (transaction_id, amount in cents)
+    tx_ids = list({str(tx['transaction_id']) for tx in txs if tx.get('transaction_id')})
+    index = {}
+    for part in chunked(tx_ids, 200):
+        for v in supabase.table("VerifyPayment").select("*").in_("transaction_id", part).eq("status", "unused").execute().data or []:
+            index.setdefault((str(v["transaction_id"]), round(float(v["amount_usd"]) * 100)), []).append(v)
+
+    matched, unmatched, used = [], [], set()
+    for tx in txs:
+        key_id = str(tx.get('transaction_id'))
+        cents = round(float(tx["amount"]) * 100)
+        hit = key_id not in used and any(
+            abs(float(v["amount_usd"]) - float(tx["amount"])) < 0.01
+            for c in (cents - 1, cents, cents + 1) for v in index.get((key_id, c), [])
+        )
+        if hit: used.add(key_id); matched.append(tx)
+        else: unmatched.append(tx)
+    return matched, unmatched
+
+def settle_transactions(txs):
+    matched, unmatched = verify_transactions(txs)
+
+    if matched:
+        # Conditional claim first: only rows still Pending are credited, so a re-read or a second replica can't double-credit
+        accepted = []
+        for part in chunked([tx['id'] for tx in matched], 200):
+            accepted += supabase.table("transactions").update({"status": "Accepted"}).in_("id", part).eq("status", "Pending").execute().data or []
+        for part in chunked(list({str(tx['transaction_id']) for tx in accepted}), 200):
+            supabase.table("VerifyPayment").update({"status": "used"}).in_("transaction_id", part).execute()
+        for tx in accepted:
+            update_user_balance(tx['email'], float(tx["amount"]), "topup", tx['id'])
+            mmk_amt = float(tx["amount"]) * config.USD_TO_MMK
+            msg = f"✅ <b>Auto Top-up Completed</b>\n\n👤 User: {tx['email']}\n💳 Method: {tx['method']}\n💰 Amount USD: {tx['amount']}\n🇲🇲 Amount MMK: {mmk_amt:,.0f}\n🧾 Transaction ID: {tx['transaction_id']}"
+            send_log_retry(config.AFFILIATE_GROUP_ID, msg)
+
+    if unmatched:
+        moved = []
+        for part in chunked([tx['id'] for tx in unmatched], 200):
+            moved += supabase.table("transactions").update({"status": "Processing"}).in_("id", part).eq("status", "Pending").execute().data or []
+        for tx in moved:
+            tx_id = tx['id']
+            mmk_amt = float(tx["amount"]) * config.USD_TO_MMK
+            msg = f"🆕 <b>New Unverified Transaction</b>\n\n🆔 ID: {tx_id}\n📧 Email: {tx['email']}\n💳 Method: {tx['method']}\n💵 Amount USD: {tx['amount']}\n🇲🇲 Amount MMK: {mmk_amt:,.0f}\n🧾 Transaction ID: {tx.get('transaction_id', 'N/A')}\n\n🛠 <b>Admin Commands:</b>\n/Yes {tx_id}\n/No {tx_id}"
+            send_log_retry(config.AFFILIATE_GROUP_ID, msg)
+
+TX_MARK = Watermark("transactions")
+
+def poll_transactions_once():
+    for txs in TX_MARK.pages(lambda: supabase.table("transactions").select("*").eq("status", "Pending")):
+        settle_transactions(txs)
 
 # 4. AFFILIATE POLLER
-def poll_affiliate():
-    processed_aff = set()
-    while True:
-        try:
-            reqs = supabase.table("affiliate").select("*").eq("status", "Pending").execute().data or []
-            for req in reqs:
-                rid = req['id']
-                if rid in processed_aff: continue
-                supabase.table("affiliate").update({"status": "Processing"}).eq("id", rid).execute()
-                mmk_amt = float(req['amount']) * config.USD_TO_MMK
-                if str(req.get('method')).lower() == 'topup':
-                    msg = f"💰 <b>Affiliate Topup</b>\n\n🆔 ID = {rid}\n📧 Email = {req['email']}\n💳 Method = TopUp\n💵 Amount USD = {req['amount']}\n🇲🇲 Amount MMK = {mmk_amt:,.0f}"
-                else:
-                    msg = f"🆕 <b>New Affiliate Request</b>\n\n🆔 ID = {rid}\n📧 Email = {req['email']}\n💰 Amount = {req['amount']}\n💳 Method = {req['method']}\n📱 Phone ID = {req.get('phone_id','-')}\n👤 Name = {req.get('name','-')}\n\n🇲🇲 Amount MMK = {mmk_amt:,.0f}\n🛠 <b>Admin Actions:</b>\n/Accept {rid}\n/Failed {rid}"
-                send_log_retry(config.AFFILIATE_GROUP_ID, msg)
-                processed_aff.add(rid)
-        except: pass
-        time.sleep(10)
+AFF_MARK = Watermark("affiliate")
+
+def poll_affiliate_once():
+    for req in AFF_MARK.rows(lambda: supabase.table("affiliate").select("*").eq("status", "Pending")):
+        rid = req['id']
+        supabase.table("affiliate").update({"status": "Processing"}).eq("id", rid).execute()
+        mmk_amt = float(req['amount']) * config.USD_TO_MMK
+        if str(req.get('method')).lower() == 'topup':
+            msg = f"💰 <b>Affiliate Topup</b>\n\n🆔 ID = {rid}\n📧 Email = {req['email']}\n💳 Method = TopUp\n💵 Amount USD = {req['amount']}\n🇲🇲 Amount MMK = {mmk_amt:,.0f}"
+        else:
+            msg = f"🆕 <b>New Affiliate Request</b>\n\n🆔 ID = {rid}\n📧 Email = {req['email']}\n💰 Amount = {req['amount']}\n💳 Method = {req['method']}\n📱 Phone ID = {req.get('phone_id','-')}\n👤 Name = {req.get('name','-')}\n\n🇲🇲 Amount MMK = {mmk_amt:,.0f}\n🛠 <b>Admin Actions:</b>\n/Accept {rid}\n/Failed {rid}"
+        send_log_retry(config.AFFILIATE_GROUP_ID, msg)
 
 # 5. SUPPORT POLLER
-def poll_supportbox_worker():
-    while True:
-        try:
-            tickets = supabase.table("SupportBox").select("*").eq("status", "Pending").execute().data or []
-            for t in tickets:
-                lid = str(t.get("order_id", ""))
-                subject = str(t.get("subject", "No Subject"))
-                email = str(t.get("email", "No Email"))
-                msg_content = str(t.get("message", "-"))
-                msg = f"📢 <b>New Support Ticket</b>\nID - {t['id']}\nEmail - {email}\nSubject - {html.escape(subject)}\nOrder ID - {lid}\n\nMessage:\n{html.escape(msg_content)}\n\nCommands:\n/Answer {t['id']} reply message\n/Close {t['id']}"
-                send_log_retry(config.SUPPORT_GROUP_ID, msg)
-                supabase.table("SupportBox").update({"status": "Processing"}).eq("id", t['id']).execute()
-        except: pass
-        time.sleep(10)
+SUPPORT_MARK = Watermark("SupportBox")
+
+def poll_supportbox_once():
+    for t in SUPPORT_MARK.rows(lambda: supabase.table("SupportBox").select("*").eq("status", "Pending")):
+        lid = str(t.get("order_id", ""))
+        subject = str(t.get("subject", "No Subject"))
+        email = str(t.get("email", "No Email"))
+        msg_content = str(t.get("message", "-"))
+        msg = f"📢 <b>New Support Ticket</b>\nID - {t['id']}\nEmail - {email}\nSubject - {html.escape(subject)}\nOrder ID - {lid}\n\nMessage:\n{html.escape(msg_content)}\n\nCommands:\n/Answer {t['id']} reply message\n/Close {t['id']}"
+        send_log_retry(config.SUPPORT_GROUP_ID, msg)
+        supabase.table("SupportBox").update({"status": "Processing"}).eq("id", t['id']).execute()
 
 # 7. RATE CHECKER
-def check_smmgen_rates_loop():
-    print("📈 Rate Checker Worker Started...")
-    while True:
-        try:
-            payload = {'key': config.SMM_API_KEY, 'action': 'services'}
-            res = requests.post(config.SMM_API_URL, data=payload, timeout=30).json()
-            local = supabase.table("services").select("id, service_id, buy_price, sell_price, service_name").execute().data or []
-            
-            for ls in local:
-                api_svc = next((s for s in res if str(s['service']) == str(ls['service_id'])), None)
-                if api_svc:
-                    api_rate = float(api_svc['rate'])
-                    old_buy = float(ls['buy_price'])
-                    current_sell = float(ls['sell_price'])
-                    
-                    # Update if price changed OR if we are losing money (Buy > Sell)
-                    if abs(old_buy - api_rate) > 0.0001 or api_rate >= current_sell:
-                        
-                        # 🔥 USE UTILS (Centralized Logic)
-                        new_sell = calculate_sell_price(api_rate, ls['service_name'])
-                        
-                        supabase.table("services").update({
-                            "buy_price": api_rate,
-                            "sell_price": new_sell
-                        }).eq("id", ls['id']).execute()
-                        
-                        msg = f"📉📈 <b>Price Updated</b>\n🆔 {ls['service_id']}\n📦 {ls['service_name']}\n💵 Buy: {old_buy} ➝ {api_rate}\n💰 Sell: {current_sell} ➝ {new_sell}"
-                        send_log_retry(config.REPORT_GROUP_ID, msg)
-        except Exception as e: print(f"❌ Rate Check Error: {e}")
-        time.sleep(3600)
+RATE_SYNC_STATE = {"hash": None, "at": 0.0}
+
+def sync_smmgen_rates(force=False):
+    # One dict lookup per local service, one bulk price write for the diff, one digest report
+    smm_services.get(max_age=config.RATE_SYNC_INTERVAL / 2)
+    # Byte-identical catalog: nothing moved supplier-side. A periodic full pass still catches local edits (/swap, /Change)
+    if not force and smm_services.hash == RATE_SYNC_STATE["hash"] and time.time() - RATE_SYNC_STATE["at"] < config.RATE_SYNC_FULL_INTERVAL: return 0
+    api = smm_services.by_id
+    catalog.refresh()  # diff against fresh prices
+    local = [ls for ls in catalog.all() if str(ls.get('service_id')) in api]
+    rates = [float(api[str(ls['service_id'])]['rate']) for ls in local]
+    sells = pricing.price_many(rates, [ls.get('service_name') for ls in local], [ls.get('category') for ls in local], [ls.get('type') for ls in local]).tolist()
+    changed = []; lines = []
+    for ls, api_rate, new_sell in zip(local, rates, sells):
+        old_buy = float(ls.get('buy_price') or 0)
+        current_sell = float(ls.get('sell_price') or 0)
+        # Update if price changed OR if we are losing money (Buy > Sell)
+        if abs(old_buy - api_rate) > 0.0001 or api_rate >= current_sell:
+            changed.append({"id": ls["id"], "buy_price": api_rate, "sell_price": new_sell})
+            lines.append(f"🆔 {ls['service_id']} {html.escape(clean_service_name(ls['service_name']))}\n   💵 {old_buy} ➝ {api_rate} · 💰 {current_sell} ➝ {new_sell}\n")
+    catalog.write_prices(changed)
+    RATE_SYNC_STATE.update(hash=smm_services.hash, at=time.time())
+    for page in paginate_blocks(lines):
+        send_log_retry(config.REPORT_GROUP_ID, f"📉📈 <b>Prices Updated ({len(changed)})</b>\n\n{page}")
+    return len(changed)
+
+def check_smmgen_rates_once():
+    sync_smmgen_rates()
+
+# ⏰ JOB TABLE (scheduler.py runs these on the bot's event loop; cadence lives here)
+def register_jobs(sched):
+    sched.add("orders", process_pending_orders_once, 5, triggers=["WebsiteOrders"], max_backoff=60)
+    sched.add("status", poll_smmgen_status_once, config.STATUS_TICK, max_backoff=300)
+    # Singletons: one replica at a time (lease), the others stand by
+    sched.add("transactions", poll_transactions_once, 10, triggers=["transactions"], singleton=True)
+    sched.add("affiliate", poll_affiliate_once, 10, triggers=["affiliate"], singleton=True)
+    sched.add("support", poll_supportbox_once, 10, triggers=["SupportBox"], singleton=True)
+    sched.add("rates", check_smmgen_rates_once, config.RATE_SYNC_INTERVAL, max_backoff=3600, first_delay=30, singleton=True)
+    sched.add("sales_rollup", rollup_sales_once, config.SALES_ROLLUP_INTERVAL, singleton=True)
+    sched.add("rewards", settle_rewards_once, config.REWARD_SETTLE_INTERVAL, singleton=True)
@@ -0,0 +1,79 @@
+import os
+import json
+import time
+import threading
+import config
+
+# 📒 SUBMISSION JOURNAL
+# Append-only JSONL, fsync'd *before* the supplier call. Replayed on startup so an
+# order whose `add` may already have gone through is reconciled, never resent.
+#   intent   -> about to call the supplier (outcome unknown until the next record)
+#   sent     -> supplier accepted, supplier_order_id known, DB not yet updated
+#   done     -> DB updated, nothing left to do
+#   failed   -> supplier rejected / request never left, safe to retry
+#   released -> admin confirmed a new attempt is allowed
+OPEN_STATES = ("intent", "sent")
+
+class SubmitJournal:
+    def __init__(self, path=None):
+        self.path = path or config.SUBMIT_JOURNAL_PATH
+        self._lock = threading.Lock()
+        self._state = {}
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._load()
+        self._fh = open(self.path, "a", encoding="utf-8")
+        if self._fh.tell() and not self._ends_with_newline(): self._fh.write("\n")  # seal a torn tail
+
+    def _ends_with_newline(self):
+        with open(self.path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    @staticmethod
+    def key_for(order):
+        return f"wo-{order['id']}"
+
+    def _load(self):
+        if not os.path.exists(self.path): return
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try: rec = json.loads(line)
+                except ValueError: continue  # torn last line from a crash
+                self._state[rec["key"]] = rec
+
+    def _append(self, key, order_id, state, **extra):
+        rec = {"key": key, "order_id": order_id, "state": state, "ts": time.time(), **extra}
+        with self._lock:
+            self._fh.write(json.dumps(rec) + "\n")
+            self._fh.flush()
+            os.fsync(self._fh.fileno())
+            self._state[key] = rec
+        return rec
+
+    def last(self, key):
+        return self._state.get(key)
+
+    def intent(self, key, order_id, alerted=False): return self._append(key, order_id, "intent", alerted=alerted)
+    def sent(self, key, order_id, supplier_order_id): return self._append(key, order_id, "sent", supplier_order_id=supplier_order_id)
+    def done(self, key, order_id): return self._append(key, order_id, "done")
+    def failed(self, key, order_id, error=""): return self._append(key, order_id, "failed", error=str(error)[:200])
+    def released(self, key, order_id): return self._append(key, order_id, "released")
+
+    def unresolved(self):
+        with self._lock:
+            return [r for r in self._state.values() if r["state"] in OPEN_STATES]
+
+    def compact(self):
+        # Keep only records that still matter; atomic replace so a crash never loses the journal
+        with self._lock:
+            keep = [r for r in self._state.values() if r["state"] in OPEN_STATES]
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                for r in keep: f.write(json.dumps(r) + "\n")
+                f.flush(); os.fsync(f.fileno())
+            self._fh.close()
+            os.replace(tmp, self.path)
+            self._fh = open(self.path, "a", encoding="utf-8")
+            self._state = {r["key"]: r for r in keep}
+
+journal = SubmitJournal()
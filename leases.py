@@ -0,0 +1,104 @@
+import time
+import threading
+import config
+from db import supabase
+
+# 👑 LEASES & SHARDS (sql/011_job_leases.sql)
+# Singleton jobs run only on the replica holding "job-<name>", and only the holder of
+# "telegram-updates" polls Telegram (bot.py run_replica). Order submission and
+# status polling are split by shard_of(order id) across REPLICA_COUNT replicas; each
+# replica leases its own shard and adopts shards whose owner stopped heartbeating, then
+# hands them back once the owner is alive again. One replica -> in-process leases.
+SHARD_BUCKETS = 1024
+
+class LocalLeases:
+    # In-process stand-in with the same semantics, for single-replica runs and tests
+    def __init__(self, holder):
+        self.holder = holder
+        self._lock = threading.Lock()
+        self._leases = {}
+
+    def acquire(self, name, ttl, holder=None):
+        holder = holder or self.holder
+        now = time.monotonic()
+        with self._lock:
+            cur = self._leases.get(name)
+            if cur and cur[0] != holder and cur[1] > now: return False
+            self._leases[name] = (holder, now + ttl)
+            return True
+
+    def release(self, name, holder=None):
+        with self._lock:
+            cur = self._leases.get(name)
+            if cur and cur[0] == (holder or self.holder): del self._leases[name]
+
+    def alive(self, name):
+        with self._lock:
+            cur = self._leases.get(name)
+            return bool(cur and cur[1] > time.monotonic())
+
+class DbLeases:
+    def __init__(self, holder):
+        self.holder = holder
+
+    def acquire(self, name, ttl, holder=None):
+        return bool(supabase.rpc("acquire_job_lease", {"p_name": name, "p_holder": holder or self.holder, "p_ttl_seconds": int(ttl)}).execute().data)
+
+    def release(self, name, holder=None):
+        supabase.rpc("release_job_lease", {"p_name": name, "p_holder": holder or self.holder}).execute()
+
+    def alive(self, name):
+        return bool(supabase.rpc("job_lease_alive", {"p_name": name}).execute().data)
+
+def shard_of(order_id, count=None):
+    return (int(order_id) % SHARD_BUCKETS) % (count or config.REPLICA_COUNT)
+
+def shard_buckets(shards, count=None):
+    # shard_bucket values (id % 1024) covered by `shards`, for an in_() filter
+    count = count or config.REPLICA_COUNT
+    return [b for b in range(SHARD_BUCKETS) if b % count in set(shards)]
+
+class ShardOwnership:
+    # One per sharded job, so a shard is only handed over between that job's runs
+    def __init__(self, prefix, leases, index=None, count=None, ttl=None):
+        self.prefix = prefix
+        self.leases = leases
+        self.index = config.REPLICA_INDEX if index is None else index
+        self.count = count or config.REPLICA_COUNT
+        self.ttl = ttl or config.LEASE_TTL
+        self._owned = None
+        self._checked = 0.0
+
+    def owned(self):
+        if self.count == 1: return [0]
+        if self._owned is not None and time.monotonic() - self._checked < self.ttl / 3: return self._owned
+        self.leases.acquire(f"replica-{self.index}", self.ttl)  # heartbeat
+        mine = []
+        for s in range(self.count):
+            name = f"{self.prefix}-shard-{s}"
+            if s != self.index and self.leases.alive(f"replica-{s}"):
+                self.leases.release(name)  # owner is up: hand back (no-op unless we adopted it)
+            elif self.leases.acquire(name, self.ttl):
+                mine.append(s)
+        if mine != self._owned: print(f"👑 {self.prefix} shards owned: {mine}")
+        self._owned, self._checked = mine, time.monotonic()
+        return mine
+
+    def owns(self, order_id):
+        return self.count == 1 or shard_of(order_id, self.count) in self.owned()
+
+    def filter(self, query):
+        # Restrict a WebsiteOrders query to owned shards (returns None if we own none)
+        if self.count == 1: return query
+        shards = self.owned()
+        return query.in_("shard_bucket", shard_buckets(shards, self.count)) if shards else None
+
+    def release_all(self):
+        if self.count == 1: return
+        for s in range(self.count): self.leases.release(f"{self.prefix}-shard-{s}")
+        self.leases.release(f"replica-{self.index}")  # let the others adopt right away
+        self._owned = None
+
+leases = DbLeases(config.REPLICA_ID) if config.REPLICA_COUNT > 1 else LocalLeases(config.REPLICA_ID)
+order_shards = ShardOwnership("orders", leases)
+status_shards = ShardOwnership("status", leases)
@@ -0,0 +1,15 @@
+from db import supabase
+
+# 💰 BALANCE LEDGER (sql/003_balance_ledger.sql)
+# One RPC per balance change: the increment and its ledger row happen atomically in
+# Postgres, so concurrent orders/refunds/top-ups can't overwrite each other.
+
+def credit(email, amount, reason, ref=None):
+    # Returns the new balance, or None if the user doesn't exist
+    res = supabase.rpc("ledger_credit", {"p_email": email, "p_delta": amount, "p_reason": reason, "p_ref": None if ref is None else str(ref)}).execute()
+    return None if res.data is None else float(res.data)
+
+def debit(email, amount, reason, ref=None):
+    # Returns the new balance, or None if the balance doesn't cover it
+    res = supabase.rpc("ledger_debit", {"p_email": email, "p_amount": amount, "p_reason": reason, "p_ref": None if ref is None else str(ref)}).execute()
+    return None if res.data is None else float(res.data)
@@ -0,0 +1,118 @@
+import time
+import threading
+from collections import deque
+import requests
+from requests.adapters import HTTPAdapter
+import config
+
+# 📮 TELEGRAM OUTBOX
+# Group notifications are queued and drained by one sender thread over a keep-alive
+# session. Each chat is paced (Telegram allows ~20 msgs/min per group) and 429
+# retry_after is honoured. Chats in DIGEST_CHATS are merged into one message every
+# DIGEST_INTERVAL seconds instead of one message per event.
+MAX_LEN = 4096
+SEPARATOR = "\n➖➖➖➖➖➖➖➖➖➖\n"
+
+class TelegramOutbox:
+    def __init__(self, token=None):
+        self.url = f"https://api.telegram.org/bot{token or config.BOT_TOKEN}/sendMessage"
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_maxsize=2))
+        self._cv = threading.Condition()
+        self._queues = {}
+        self._since = {}
+        self._next_ok = {}
+        self._last_send = 0.0
+        self._busy = False
+        self._thread = None
+
+    def send(self, chat_id, text, parse_mode="HTML"):
+        if not chat_id or str(chat_id) == "0": return
+        with self._cv:
+            q = self._queues.setdefault(chat_id, deque())
+            if not q: self._since[chat_id] = time.monotonic()
+            q.append({"text": text, "parse_mode": parse_mode, "tries": 0})
+            self._cv.notify()
+            if not self._thread:
+                self._thread = threading.Thread(target=self._run, name="outbox", daemon=True)
+                self._thread.start()
+
+    def pending(self):
+        with self._cv:
+            return sum(len(q) for q in self._queues.values()) + (1 if self._busy else 0)
+
+    def flush(self, timeout=10):
+        end = time.monotonic() + timeout
+        while self.pending() and time.monotonic() < end: time.sleep(0.1)
+
+    def _ready_at(self, chat_id):
+        at = self._next_ok.get(chat_id, 0.0)
+        if chat_id in config.DIGEST_CHATS: at = max(at, self._since[chat_id] + config.DIGEST_INTERVAL)
+        return at
+
+    def _next_batch(self):
+        with self._cv:
+            while True:
+                now = time.monotonic(); wait = None
+                for chat_id, q in self._queues.items():
+                    if not q: continue
+                    at = self._ready_at(chat_id)
+                    if at <= now:
+                        self._busy = True
+                        return chat_id, self._take(chat_id, q)
+                    wait = at - now if wait is None else min(wait, at - now)
+                self._cv.wait(wait)
+
+    def _take(self, chat_id, q):
+        first = q.popleft()
+        if chat_id not in config.DIGEST_CHATS or first["parse_mode"] != "HTML": return [first]
+        # Merge as many queued events as fit in one message
+        batch = [first]; size = len(first["text"])
+        while q and q[0]["parse_mode"] == "HTML" and size + len(SEPARATOR) + len(q[0]["text"]) <= MAX_LEN:
+            size += len(SEPARATOR) + len(q[0]["text"])
+            batch.append(q.popleft())
+        if q: self._since[chat_id] = time.monotonic() - config.DIGEST_INTERVAL  # leftovers go out on the next slot
+        return batch
+
+    def _requeue(self, chat_id, batch):
+        with self._cv:
+            q = self._queues.setdefault(chat_id, deque())
+            q.extendleft(reversed(batch))
+            self._since.setdefault(chat_id, time.monotonic())
+
+    def _run(self):
+        while True:
+            chat_id, batch = self._next_batch()
+            try: self._deliver(chat_id, batch)
+            except Exception as e: print(f"⚠️ Outbox error: {e}")
+            finally:
+                with self._cv: self._busy = False
+
+    def _deliver(self, chat_id, batch):
+        gap = config.OUTBOX_GLOBAL_INTERVAL - (time.monotonic() - self._last_send)
+        if gap > 0: time.sleep(gap)
+        payload = {"chat_id": chat_id, "text": SEPARATOR.join(m["text"] for m in batch),
+                   "parse_mode": batch[0]["parse_mode"], "disable_web_page_preview": True}
+        try:
+            res = self.session.post(self.url, json=payload, timeout=10)
+            status = res.status_code
+        except requests.RequestException:
+            status = None
+        self._last_send = time.monotonic()
+        self._next_ok[chat_id] = self._last_send + config.OUTBOX_CHAT_INTERVAL
+
+        if status == 200: return
+        if status == 429:
+            try: retry_after = res.json().get("parameters", {}).get("retry_after", 5)
+            except ValueError: retry_after = 5
+            self._next_ok[chat_id] = time.monotonic() + retry_after
+            return self._requeue(chat_id, batch)
+        if status is None or status >= 500:
+            batch = [dict(m, tries=m["tries"] + 1) for m in batch if m["tries"] < 2]
+            if batch:
+                self._next_ok[chat_id] = time.monotonic() + 2
+                self._requeue(chat_id, batch)
+            return
+        print(f"❌ Outbox dropped message for {chat_id}: {status} {res.text[:200]}")
+
+outbox = TelegramOutbox()
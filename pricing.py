@@ -0,0 +1,71 @@
+import time
+import threading
+import numpy as np
+import config
+from db import supabase
+
+# 🏷️ PRICING RULES (sql/007_pricing_rules.sql)
+# Rules are applied column-wise over the whole batch: one boolean mask per rule, first
+# (highest priority) match wins. Repricing the full catalog is a few array ops per rule.
+DEFAULT_RULES = [
+    {"priority": 10, "keyword": "view", "multiplier": 3.0},
+    {"priority": 0, "multiplier": 1.4},
+]
+FALLBACK_MULTIPLIER = 1.4
+DEFAULT_STEP = 0.0001
+
+def _lower(values, n):
+    return np.char.lower(np.array([str(v or "") for v in (values if values is not None else [""] * n)], dtype=str).reshape(n))
+
+class PricingEngine:
+    def __init__(self, ttl=None):
+        self.ttl = ttl if ttl is not None else config.PRICING_TTL
+        self._lock = threading.Lock()
+        self._rules = None
+        self._loaded_at = 0.0
+
+    def refresh(self):
+        rows = supabase.table("pricing_rules").select("*").eq("active", True).execute().data or []
+        with self._lock:
+            self._rules = sorted(rows or DEFAULT_RULES, key=lambda r: -int(r.get("priority") or 0))
+            self._loaded_at = time.monotonic()
+
+    def invalidate(self):
+        self._loaded_at = 0.0
+
+    def rules(self):
+        if self._rules is None or time.monotonic() - self._loaded_at >= self.ttl:
+            try: self.refresh()
+            except Exception as e:
+                print(f"⚠️ Pricing rules refresh failed, using {'cached' if self._rules else 'built-in'} rules: {e}")
+                if self._rules is None: self._rules = sorted(DEFAULT_RULES, key=lambda r: -r["priority"])
+        return self._rules
+
+    def price_many(self, buy_prices, names, categories=None, types=None):
+        buy = np.asarray(buy_prices, dtype=float).reshape(-1)
+        n = len(buy)
+        if not n: return buy
+        names, cats, kinds = _lower(names, n), _lower(categories, n), _lower(types, n)
+        mult = np.full(n, np.nan); floor = np.zeros(n); step = np.full(n, DEFAULT_STEP)
+        for r in self.rules():
+            m = np.isnan(mult)
+            if not m.any(): break
+            if r.get("category"): m &= cats == r["category"].lower()
+            if r.get("type"): m &= kinds == r["type"].lower()
+            if r.get("keyword"): m &= np.char.find(names, r["keyword"].lower()) >= 0
+            mult[m] = float(r["multiplier"])
+            floor[m] = float(r.get("min_sell") or 0)
+            step[m] = float(r.get("round_to") or DEFAULT_STEP)
+        mult[np.isnan(mult)] = FALLBACK_MULTIPLIER
+        sell = np.maximum(buy * mult, floor)
+        return np.round(np.round(sell / step) * step, 6)
+
+    def price_services(self, rows, buy_key="buy_price"):
+        # Services rows -> new sell prices (floats), same order
+        return self.price_many([float(r.get(buy_key) or 0) for r in rows], [r.get("service_name") for r in rows],
+                               [r.get("category") for r in rows], [r.get("type") for r in rows]).tolist()
+
+    def price(self, buy_price, service_name, category=None, type=None):
+        return float(self.price_many([buy_price], [service_name], [category], [type])[0])
+
+pricing = PricingEngine()
@@ -0,0 +1,141 @@
+import time
+import random
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import config
+from changefeed import change_feed
+from leases import leases
+
+# ⏰ JOB SCHEDULER
+# Every background job is a "once" function run by one coroutine on the bot's event
+# loop: interval + jitter between runs, exponential backoff while it keeps failing,
+# never two runs of the same job at once, and an early run when one of its change-feed
+# tables fires. The job bodies are blocking Supabase/HTTP code, so each run executes
+# on a small shared executor; the timing and lifecycle all live here.
+# A job may return a number to override the delay before its next run.
+# singleton=True jobs only run on the replica holding the "job-<name>" lease (leases.py);
+# a heartbeat renews held leases every LEASE_TTL/3, however long the job sleeps or runs.
+
+class Job:
+    def __init__(self, name, fn, interval, jitter=None, triggers=(), max_backoff=None, first_delay=0.0, singleton=False):
+        self.name = name
+        self.fn = fn
+        self.interval = interval
+        self.jitter = config.JOB_JITTER if jitter is None else jitter
+        self.triggers = tuple(triggers)
+        self.max_backoff = max_backoff or config.JOB_MAX_BACKOFF
+        self.first_delay = first_delay
+        self.singleton = singleton
+        self.leader = False
+        self.failures = 0
+        self.runs = 0
+        self.last_run = None
+        self.last_error = None
+        self.running = False
+        self.wake = None
+
+class JobScheduler:
+    def __init__(self):
+        self.jobs = {}
+        self._tasks = []
+        self._loop = None
+        self._stop = None
+        self._pool = None
+
+    def add(self, name, fn, interval, **kw):
+        self.jobs[name] = Job(name, fn, interval, **kw)
+        return self.jobs[name]
+
+    def trigger(self, name):
+        # Thread-safe: run `name` now (or right after its current run)
+        job = self.jobs.get(name)
+        if job and job.wake and self._loop: self._loop.call_soon_threadsafe(job.wake.set)
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, len(self.jobs)), thread_name_prefix="job")
+        for job in self.jobs.values():
+            job.wake = asyncio.Event()
+            for table in job.triggers: change_feed.subscribe(table, lambda row, n=job.name: self.trigger(n))
+            self._tasks.append(asyncio.create_task(self._run(job), name=f"job:{job.name}"))
+        if any(j.singleton for j in self.jobs.values()): self._tasks.append(asyncio.create_task(self._heartbeat(), name="job:leases"))
+        print(f"⏰ Scheduler started: {', '.join(self.jobs)}")
+
+    async def stop(self, timeout=30):
+        if not self._stop: return
+        self._stop.set()
+        for job in self.jobs.values():
+            if job.wake: job.wake.set()
+        # Waits for runs in progress (they are blocking calls and can't be cancelled mid-flight)
+        done, pending = await asyncio.wait(self._tasks, timeout=timeout) if self._tasks else (set(), set())
+        for t in pending: t.cancel()
+        for job in self.jobs.values():
+            if job.leader:
+                try: await self._loop.run_in_executor(None, leases.release, f"job-{job.name}")
+                except Exception as e: print(f"⚠️ Lease release failed ({job.name}): {e}")
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        print(f"⏰ Scheduler stopped ({len(pending)} job(s) still running at shutdown)")
+
+    def _delay(self, job, result):
+        if job.failures:
+            base = min(job.max_backoff, max(job.interval, 5) * 2 ** (job.failures - 1))
+        elif isinstance(result, (int, float)) and not isinstance(result, bool):
+            return max(0.0, float(result))
+        else:
+            base = job.interval
+            if job.triggers and change_feed.live: base = max(base, config.FEED_FALLBACK_INTERVAL)
+        return base * random.uniform(1 - job.jitter, 1 + job.jitter)
+
+    async def _sleep(self, job, delay):
+        # Returns early on a trigger or shutdown
+        waiters = [asyncio.create_task(job.wake.wait()), asyncio.create_task(self._stop.wait())]
+        try: await asyncio.wait(waiters, timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for w in waiters: w.cancel()
+
+    async def _lead(self, job):
+        # Take/renew the job's lease before a run; a dead leader is replaced within LEASE_TTL
+        try: leader = await self._loop.run_in_executor(None, leases.acquire, f"job-{job.name}", config.LEASE_TTL)
+        except Exception as e:
+            print(f"⚠️ Lease check failed ({job.name}): {e}"); leader = False
+        if leader != job.leader: print(f"👑 {job.name}: {'leader' if leader else 'standby'}")
+        job.leader = leader
+        return leader
+
+    async def _heartbeat(self):
+        # Renew held leases on a fixed beat: a job's sleep (feed fallback, backoff) can outlast the TTL
+        while not self._stop.is_set():
+            try: await asyncio.wait_for(self._stop.wait(), config.LEASE_TTL / 3)
+            except asyncio.TimeoutError: pass
+            if self._stop.is_set(): return
+            for job in self.jobs.values():
+                if job.singleton and job.leader: await self._lead(job)
+
+    async def _run(self, job):
+        if job.first_delay: await self._sleep(job, job.first_delay)
+        while not self._stop.is_set():
+            job.wake.clear()  # a trigger that lands during this run schedules another one right after
+            if job.singleton and not await self._lead(job):
+                await self._sleep(job, job.interval * random.uniform(1 - job.jitter, 1 + job.jitter))
+                continue
+            job.running = True; result = None
+            started = time.monotonic()
+            try:
+                result = await self._loop.run_in_executor(self._pool, job.fn)
+                job.failures = 0; job.last_error = None
+            except Exception as e:
+                job.failures += 1; job.last_error = str(e)
+                print(f"⚠️ Job {job.name} failed ({job.failures}x): {e}")
+            finally:
+                job.running = False; job.runs += 1
+                job.last_run = time.time()
+            if time.monotonic() - started > max(job.interval, 1) * 5:
+                print(f"🐢 Job {job.name} took {time.monotonic() - started:.1f}s")
+            if self._stop.is_set(): break
+            await self._sleep(job, self._delay(job, result))
+
+    def status(self):
+        return {n: {"runs": j.runs, "failures": j.failures, "running": j.running, "leader": j.leader if j.singleton else None, "last_run": j.last_run, "last_error": j.last_error} for n, j in self.jobs.items()}
+
+scheduler = JobScheduler()
@@ -0,0 +1,96 @@
+import os
+import gzip
+import json
+import time
+import bisect
+import hashlib
+import threading
+import config
+from smmgen import smm
+
+# 🗂️ SMMGEN SERVICES SNAPSHOT
+# One shared copy of `action=services` for rate sync, /swap and /add. Refreshed at most
+# every SMM_SERVICES_TTL seconds, persisted gzipped (only the fields we use) so a restart
+# doesn't re-download it, and hashed so an unchanged download skips parsing and diffing.
+# The cache file's mtime is the fetch time.
+FIELDS = ("service", "name", "type", "category", "rate", "min", "max", "refill", "cancel")
+
+class ServicesSnapshot:
+    def __init__(self, path=None, ttl=None):
+        self.path = path or config.SMM_SERVICES_CACHE_PATH
+        self.ttl = ttl if ttl is not None else config.SMM_SERVICES_TTL
+        self._lock = threading.Lock()
+        self.rows = []
+        self.by_id = {}
+        self.ids = []
+        self.max_id = 0
+        self.hash = None
+        self.fetched_at = 0.0
+        self._load()
+
+    def _load(self):
+        try:
+            with gzip.open(self.path, "rt", encoding="utf-8") as f: data = json.load(f)
+            self._set([dict(zip(data["fields"], r)) for r in data["rows"]], data["hash"], os.path.getmtime(self.path))
+        except FileNotFoundError: pass
+        except Exception as e: print(f"⚠️ SMMGen services cache unreadable, will refetch: {e}")
+
+    def _set(self, rows, digest, fetched_at):
+        self.rows = rows
+        self.by_id = {str(r["service"]): r for r in rows}
+        self.ids = sorted(int(k) for k in self.by_id if k.isdigit())
+        self.max_id = self.ids[-1] if self.ids else 0
+        self.hash = digest
+        self.fetched_at = fetched_at
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with gzip.open(tmp, "wt", encoding="utf-8") as f:
+            json.dump({"hash": self.hash, "fields": FIELDS, "rows": [[r.get(k) for k in FIELDS] for r in self.rows]}, f, separators=(",", ":"))
+        os.replace(tmp, self.path)
+
+    def age(self):
+        return time.time() - self.fetched_at
+
+    def refresh(self, max_age=0):
+        # Single-flight: callers that queued behind a fetch reuse its result. Returns True if the content changed.
+        with self._lock:
+            if self.rows and self.age() < max_age: return False
+            raw = smm.services_raw()
+            digest = hashlib.sha256(raw).hexdigest()
+            self.fetched_at = time.time()
+            if digest == self.hash:
+                try: os.utime(self.path)
+                except OSError: pass
+                return False
+            data = json.loads(raw)
+            if not isinstance(data, list): raise ValueError(f"Unexpected services response: {str(data)[:200]}")
+            self._set(data, digest, self.fetched_at)
+            try: self._save()
+            except OSError as e: print(f"⚠️ Could not persist SMMGen services cache: {e}")
+            return True
+
+    def get(self, max_age=None):
+        try: self.refresh(self.ttl if max_age is None else max_age)
+        except Exception as e:
+            # Serve the previous snapshot rather than failing the caller
+            if not self.rows: raise
+            print(f"⚠️ SMMGen services refresh failed, serving {self.age():.0f}s old snapshot: {e}")
+        return self.rows
+
+    def covering(self, lo, hi=None, min_age=60):
+        # Rows for admin commands over ids lo..hi. SMMGen ids are sparse, so gaps in a range are
+        # normal: refetch (once, unless the snapshot is brand new) only if the range reaches past
+        # our newest id or none of it is known. Two bisects, whatever the width of the range.
+        self.get()
+        lo = int(lo); hi = lo if hi is None else int(hi)
+        i = bisect.bisect_left(self.ids, lo)
+        if (hi > self.max_id or i == len(self.ids) or self.ids[i] > hi) and self.age() > min_age: self.get(max_age=0)
+        return self.rows
+
+    def lookup(self, service_id):
+        sid = str(service_id)
+        return self.by_id.get(sid) or (sid.isdigit() and self.covering(sid) and self.by_id.get(sid)) or None
+
+smm_services = ServicesSnapshot()
@@ -0,0 +1,78 @@
+import time
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+import config
+
+# 🌐 SMMGEN API CLIENT (one pooled keep-alive session shared by jobs + handlers)
+class SmmGenClient:
+    def __init__(self, url=None, key=None, pool_size=None, timeout=30):
+        self.url = url or config.SMM_API_URL
+        self.key = key or config.SMM_API_KEY
+        self.timeout = timeout
+        pool_size = pool_size or config.SMM_POOL_SIZE
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def _call(self, action, timeout=None, raw=False, **params):
+        payload = {"key": self.key, "action": action}
+        payload.update({k: v for k, v in params.items() if v is not None})
+        started = time.perf_counter()
+        ok = False
+        try:
+            res = self.session.post(self.url, data=payload, timeout=timeout or self.timeout)
+            data = res.content if raw else res.json()
+            ok = True
+            return data
+        finally:
+            self._record(action, (time.perf_counter() - started) * 1000, ok)
+
+    def _record(self, action, ms, ok):
+        with self._lock:
+            s = self._stats.setdefault(action, {"calls": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0})
+            s["calls"] += 1
+            s["total_ms"] += ms
+            s["max_ms"] = max(s["max_ms"], ms)
+            if not ok: s["errors"] += 1
+
+    def stats(self):
+        with self._lock:
+            return {a: dict(s, avg_ms=s["total_ms"] / s["calls"] if s["calls"] else 0.0) for a, s in self._stats.items()}
+
+    # --- Typed actions ---
+    def add(self, service, link, quantity, comments=None, timeout=None):
+        if comments and not isinstance(comments, str): comments = "\n".join(comments)
+        return self._call("add", timeout=timeout, service=service, link=link, quantity=quantity, comments=comments or None)
+
+    def status_many(self, order_ids, timeout=None):
+        return self._call("status", timeout=timeout, orders=",".join(str(x) for x in order_ids))
+
+    def services(self, timeout=None):
+        return self._call("services", timeout=timeout or 60)
+
+    def services_raw(self, timeout=None):
+        # Undecoded body, so callers can hash it before paying for the parse (see smm_services.py)
+        return self._call("services", timeout=timeout or 60, raw=True)
+
+    def refill(self, order_id, timeout=None):
+        return self._call("refill", timeout=timeout, order=order_id)
+
+    def cancel(self, order_ids, timeout=None):
+        if isinstance(order_ids, (list, tuple, set)): order_ids = ",".join(str(x) for x in order_ids)
+        return self._call("cancel", timeout=timeout, orders=order_ids)
+
+def never_sent(exc):
+    # True if the request provably never reached SMMGen: connect timeout, refused connection,
+    # DNS failure. Read timeouts / dropped connections after sending may have been accepted.
+    if isinstance(exc, requests.exceptions.ConnectTimeout): return True
+    if isinstance(exc, requests.exceptions.ConnectionError) and not isinstance(exc, requests.exceptions.SSLError):
+        reason = getattr(exc.args[0], "reason", None) if exc.args else None
+        return isinstance(reason, NewConnectionError)  # includes NameResolutionError
+    return False
+
+smm = SmmGenClient()
@@ -0,0 +1,27 @@
+-- 📡 Change feed for the bot's pollers (LISTEN bot_changes)
+-- Fires when a row is inserted or moved (back) to Pending, so the matching poller wakes at once.
+
+create or replace function notify_bot_change() returns trigger
+language plpgsql as $$
+begin
+  if NEW.status = 'Pending' and (TG_OP = 'INSERT' or OLD.status is distinct from NEW.status) then
+    perform pg_notify('bot_changes', json_build_object('table', TG_TABLE_NAME, 'id', NEW.id, 'status', NEW.status)::text);
+  end if;
+  return NEW;
+end $$;
+
+drop trigger if exists bot_change_feed on "transactions";
+create trigger bot_change_feed after insert or update of status on "transactions"
+  for each row execute function notify_bot_change();
+
+drop trigger if exists bot_change_feed on "affiliate";
+create trigger bot_change_feed after insert or update of status on "affiliate"
+  for each row execute function notify_bot_change();
+
+drop trigger if exists bot_change_feed on "SupportBox";
+create trigger bot_change_feed after insert or update of status on "SupportBox"
+  for each row execute function notify_bot_change();
+
+drop trigger if exists bot_change_feed on "WebsiteOrders";
+create trigger bot_change_feed after insert or update of status on "WebsiteOrders"
+  for each row execute function notify_bot_change();
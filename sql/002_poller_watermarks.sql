@@ -0,0 +1,29 @@
+-- 🔖 Incremental polling: updated_at on polled tables + persisted (updated_at, id) watermarks
+
+create or replace function touch_updated_at() returns trigger
+language plpgsql as $$
+begin
+  NEW.updated_at = now();
+  return NEW;
+end $$;
+
+alter table "transactions" add column if not exists updated_at timestamptz not null default now();
+alter table "affiliate" add column if not exists updated_at timestamptz not null default now();
+alter table "SupportBox" add column if not exists updated_at timestamptz not null default now();
+
+drop trigger if exists touch_updated_at on "transactions";
+create trigger touch_updated_at before update on "transactions" for each row execute function touch_updated_at();
+drop trigger if exists touch_updated_at on "affiliate";
+create trigger touch_updated_at before update on "affiliate" for each row execute function touch_updated_at();
+drop trigger if exists touch_updated_at on "SupportBox";
+create trigger touch_updated_at before update on "SupportBox" for each row execute function touch_updated_at();
+
+create index if not exists transactions_pending_keyset on "transactions" (updated_at, id) where status = 'Pending';
+create index if not exists affiliate_pending_keyset on "affiliate" (updated_at, id) where status = 'Pending';
+create index if not exists supportbox_pending_keyset on "SupportBox" (updated_at, id) where status = 'Pending';
+
+create table if not exists poller_watermarks (
+  name text primary key,
+  updated_at timestamptz not null default 'epoch',
+  last_id bigint not null default 0
+);
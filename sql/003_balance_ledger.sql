@@ -0,0 +1,36 @@
+-- 💰 Balance ledger: every balance change is one atomic call + one append-only ledger row
+
+create table if not exists balance_ledger (
+  id bigserial primary key,
+  email text not null,
+  delta numeric not null,
+  balance_after numeric not null,
+  reason text not null,
+  ref text,
+  created_at timestamptz not null default now()
+);
+create index if not exists balance_ledger_email on balance_ledger (email, id);
+
+-- Atomic increment (negative p_delta allowed). Returns the new balance, or null if the user doesn't exist.
+create or replace function ledger_credit(p_email text, p_delta numeric, p_reason text, p_ref text default null)
+returns numeric language plpgsql as $$
+declare v_bal numeric;
+begin
+  update users set balance_usd = balance_usd + p_delta where email = p_email returning balance_usd into v_bal;
+  if not found then return null; end if;
+  insert into balance_ledger (email, delta, balance_after, reason, ref) values (p_email, p_delta, v_bal, p_reason, p_ref);
+  return v_bal;
+end $$;
+
+-- Debit only if the balance covers it. Returns the new balance, or null if insufficient / unknown user.
+create or replace function ledger_debit(p_email text, p_amount numeric, p_reason text, p_ref text default null)
+returns numeric language plpgsql as $$
+declare v_bal numeric;
+begin
+  update users set balance_usd = balance_usd - p_amount
+   where email = p_email and balance_usd >= p_amount
+   returning balance_usd into v_bal;
+  if not found then return null; end if;
+  insert into balance_ledger (email, delta, balance_after, reason, ref) values (p_email, -p_amount, v_bal, p_reason, p_ref);
+  return v_bal;
+end $$;
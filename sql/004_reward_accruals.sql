@@ -0,0 +1,51 @@
+-- 🎁 Referral (4%) and bonus (1%) rewards: status reconciliation appends accrual rows,
+-- settle_reward_accruals() applies them per beneficiary in one transaction.
+
+create table if not exists reward_accruals (
+  id bigserial primary key,
+  kind text not null check (kind in ('referral', 'bonus')),
+  email text not null,              -- customer whose order produced the reward
+  amount numeric not null,          -- signed; refunds accrue negative amounts
+  order_id bigint,
+  created_at timestamptz not null default now(),
+  settled_at timestamptz
+);
+create index if not exists reward_accruals_open on reward_accruals (id) where settled_at is null;
+
+-- Claims up to p_limit open accruals, credits referral owners' withdrawable_balance and
+-- customers' balance_usd (with a balance_ledger row), and returns one row per beneficiary.
+-- Referral accruals for customers without a ref owner are settled as no-ops.
+create or replace function settle_reward_accruals(p_limit int default 5000)
+returns table(kind text, beneficiary text, amount numeric, events int)
+language plpgsql as $$
+#variable_conflict use_column
+declare v_ids bigint[];
+begin
+  select array_agg(a.id) into v_ids from (
+    select r.id from reward_accruals r where r.settled_at is null order by r.id limit p_limit for update skip locked
+  ) a;
+  if v_ids is null then return; end if;
+  update reward_accruals r set settled_at = now() where r.id = any(v_ids);
+
+  drop table if exists _settle;
+  create temp table _settle on commit drop as
+    select r.kind as kind,
+           case when r.kind = 'referral' then u.ref_owner_id::text else r.email end as beneficiary,
+           sum(r.amount) as amount, count(*)::int as events
+      from reward_accruals r join users u on u.email = r.email
+     where r.id = any(v_ids) and (r.kind = 'bonus' or u.ref_owner_id is not null)
+     group by 1, 2;
+
+  update users u set withdrawable_balance = coalesce(u.withdrawable_balance, 0) + s.amount
+    from _settle s where s.kind = 'referral' and u.id::text = s.beneficiary;
+
+  with b as (
+    update users u set balance_usd = u.balance_usd + s.amount
+      from _settle s where s.kind = 'bonus' and u.email = s.beneficiary
+    returning u.email, s.amount, u.balance_usd
+  )
+  insert into balance_ledger (email, delta, balance_after, reason)
+  select b.email, b.amount, b.balance_usd, 'bonus' from b;
+
+  return query select s.kind, s.beneficiary, s.amount, s.events from _settle s where s.amount <> 0;
+end $$;
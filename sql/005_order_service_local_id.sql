@@ -0,0 +1,14 @@
+-- 🔗 Orders carry the local services.id they were placed against, so status handling
+-- resolves the service by primary key instead of by name
+
+alter table "WebsiteOrders" add column if not exists service_local_id bigint references services(id) on delete set null;
+create index if not exists websiteorders_service_local_id on "WebsiteOrders" (service_local_id);
+
+-- One-off backfill: exact name first, then the supplier service id the order was sent with
+update "WebsiteOrders" o set service_local_id = s.id
+  from (select distinct on (service_name) id, service_name from services order by service_name, id) s
+ where o.service_local_id is null and o.service = s.service_name;
+
+update "WebsiteOrders" o set service_local_id = s.id
+  from (select distinct on (service_id) id, service_id from services order by service_id, id) s
+ where o.service_local_id is null and o.supplier_service_id::text = s.service_id::text;
@@ -0,0 +1,121 @@
+-- 📊 Sales: status reconciliation appends one event per settled order change;
+-- rollup_sales_events() folds new events into per-service / per-user / per-day rollups
+-- and keeps services.total_sold_qty / users.total_spend in step.
+
+create table if not exists sales_events (
+  id bigserial primary key,
+  order_id bigint,
+  service_local_id bigint,
+  email text,
+  kind text not null,               -- completed | refunded | partial
+  qty_delta integer not null default 0,
+  spend_delta numeric not null default 0,
+  refund numeric not null default 0,
+  created_at timestamptz not null default now(),
+  rolled_at timestamptz
+);
+create index if not exists sales_events_open on sales_events (id) where rolled_at is null;
+
+create table if not exists sales_by_service (
+  service_local_id bigint primary key,
+  sold_qty bigint not null default 0,
+  spend numeric not null default 0,
+  refunds numeric not null default 0,
+  events bigint not null default 0,
+  updated_at timestamptz not null default now()
+);
+create index if not exists sales_by_service_spend on sales_by_service (spend desc);
+
+create table if not exists sales_by_user (
+  email text primary key,
+  spend numeric not null default 0,
+  refunds numeric not null default 0,
+  events bigint not null default 0,
+  updated_at timestamptz not null default now()
+);
+
+create table if not exists sales_by_day (
+  day date primary key,             -- Asia/Yangon calendar day
+  sold_qty bigint not null default 0,
+  spend numeric not null default 0,
+  refunds numeric not null default 0,
+  events bigint not null default 0,
+  updated_at timestamptz not null default now()
+);
+
+create or replace function rollup_sales_events(p_limit int default 10000)
+returns int language plpgsql as $$
+declare v_ids bigint[];
+begin
+  select array_agg(e.id) into v_ids from (
+    select s.id from sales_events s where s.rolled_at is null order by s.id limit p_limit for update skip locked
+  ) e;
+  if v_ids is null then return 0; end if;
+  update sales_events s set rolled_at = now() where s.id = any(v_ids);
+
+  insert into sales_by_service as t (service_local_id, sold_qty, spend, refunds, events)
+  select e.service_local_id, sum(e.qty_delta), sum(e.spend_delta), sum(e.refund), count(*)
+    from sales_events e where e.id = any(v_ids) and e.service_local_id is not null group by 1
+  on conflict (service_local_id) do update set
+    sold_qty = t.sold_qty + excluded.sold_qty, spend = t.spend + excluded.spend,
+    refunds = t.refunds + excluded.refunds, events = t.events + excluded.events, updated_at = now();
+
+  insert into sales_by_user as t (email, spend, refunds, events)
+  select e.email, sum(e.spend_delta), sum(e.refund), count(*)
+    from sales_events e where e.id = any(v_ids) and e.email is not null group by 1
+  on conflict (email) do update set
+    spend = t.spend + excluded.spend, refunds = t.refunds + excluded.refunds,
+    events = t.events + excluded.events, updated_at = now();
+
+  insert into sales_by_day as t (day, sold_qty, spend, refunds, events)
+  select (e.created_at at time zone 'Asia/Yangon')::date, sum(e.qty_delta), sum(e.spend_delta), sum(e.refund), count(*)
+    from sales_events e where e.id = any(v_ids) group by 1
+  on conflict (day) do update set
+    sold_qty = t.sold_qty + excluded.sold_qty, spend = t.spend + excluded.spend,
+    refunds = t.refunds + excluded.refunds, events = t.events + excluded.events, updated_at = now();
+
+  -- Legacy counters read by the website: one atomic increment per service / user
+  update services s set total_sold_qty = greatest(0, coalesce(s.total_sold_qty, 0) + d.qty)
+    from (select e.service_local_id, sum(e.qty_delta) qty from sales_events e
+           where e.id = any(v_ids) and e.service_local_id is not null group by 1) d
+   where s.id = d.service_local_id;
+
+  update users u set total_spend = greatest(0, coalesce(u.total_spend, 0) + d.spend)
+    from (select e.email, sum(e.spend_delta) spend from sales_events e
+           where e.id = any(v_ids) and e.email is not null group by 1) d
+   where u.email = d.email;
+
+  return array_length(v_ids, 1);
+end $$;
+
+-- One-off seed from order history (only into empty rollups; legacy counters already include it)
+with hist as (
+  select o.service_local_id, o.email, (o.created_at at time zone 'Asia/Yangon')::date as day,
+         case when lower(o.status) = 'completed' then o.quantity else greatest(0, o.quantity - coalesce(o.remain, 0)) end as qty,
+         case when lower(o.status) = 'completed' or coalesce(o.quantity, 0) = 0 then o.sell_charge
+              else o.sell_charge * greatest(0, o.quantity - coalesce(o.remain, 0)) / o.quantity end as spend,
+         o.sell_charge as charged
+    from "WebsiteOrders" o
+   where lower(o.status) in ('completed', 'partial', 'canceled', 'cancelled')
+)
+insert into sales_by_day (day, sold_qty, spend, refunds, events)
+select day, sum(qty), sum(spend), sum(charged - spend), count(*) from hist
+ where not exists (select 1 from sales_by_day) group by day;
+
+with hist as (
+  select o.service_local_id,
+         case when lower(o.status) = 'completed' then o.quantity else greatest(0, o.quantity - coalesce(o.remain, 0)) end as qty,
+         case when lower(o.status) = 'completed' or coalesce(o.quantity, 0) = 0 then o.sell_charge
+              else o.sell_charge * greatest(0, o.quantity - coalesce(o.remain, 0)) / o.quantity end as spend,
+         o.sell_charge as charged
+    from "WebsiteOrders" o
+   where lower(o.status) in ('completed', 'partial', 'canceled', 'cancelled') and o.service_local_id is not null
+)
+insert into sales_by_service (service_local_id, sold_qty, spend, refunds, events)
+select service_local_id, sum(qty), sum(spend), sum(charged - spend), count(*) from hist
+ where not exists (select 1 from sales_by_service) group by service_local_id;
+
+insert into sales_by_user (email, spend, events)
+select u.email, coalesce(u.total_spend, 0), 0 from users u
+ where u.email is not null and not exists (select 1 from sales_by_user)
+on conflict (email) do nothing;
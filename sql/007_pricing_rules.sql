@@ -0,0 +1,22 @@
+-- 🏷️ Declarative markup rules. The highest-priority active rule whose non-null match
+-- fields all match a service sets its price: sell = max(buy × multiplier, min_sell),
+-- rounded to the nearest round_to. Null match fields are wildcards.
+
+create table if not exists pricing_rules (
+  id bigserial primary key,
+  priority integer not null default 0,
+  category text,                    -- services.category (SMMGen category), case-insensitive
+  type text,                        -- services.type (our menu type), case-insensitive
+  keyword text,                     -- substring of service_name, case-insensitive
+  multiplier numeric not null,
+  min_sell numeric not null default 0,
+  round_to numeric not null default 0.0001,
+  active boolean not null default true,
+  note text
+);
+
+-- Seed with the markup that used to be hard-coded
+insert into pricing_rules (priority, keyword, multiplier, note)
+select 10, 'view', 3.0, 'views' where not exists (select 1 from pricing_rules);
+insert into pricing_rules (priority, multiplier, note)
+select 0, 1.4, 'default' where not exists (select 1 from pricing_rules where keyword is null and category is null and type is null);
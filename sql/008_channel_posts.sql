@@ -0,0 +1,18 @@
+-- 📣 One row per published channel chunk: /post only edits chunks whose rendered text hash changed
+
+create table if not exists channel_posts (
+  post_key text primary key,        -- "<category>#<chunk index>"
+  channel_msg_id bigint not null,
+  content_hash text,
+  service_ids bigint[] not null default '{}',
+  updated_at timestamptz not null default now()
+);
+
+-- Adopt messages published before this table existed (null hash -> edited once on the next /post)
+insert into channel_posts (post_key, channel_msg_id, service_ids)
+select category || '#' || (row_number() over (partition by category order by min_id) - 1), channel_msg_id, ids
+  from (select category, channel_msg_id, min(id) as min_id, array_agg(id order by id) as ids
+          from services
+         where coalesce(channel_msg_id, 0) <> 0 and category is not null
+         group by category, channel_msg_id) m
+on conflict (post_key) do nothing;
@@ -0,0 +1,25 @@
+-- 🖼️ Channel display fields computed once at write time (mirrors utils.classify_service)
+-- plus the (category, id) index the /post renderer pages through.
+
+alter table services add column if not exists name_normalized text;
+alter table services add column if not exists icon text;
+
+create or replace function classify_service() returns trigger
+language plpgsql as $$
+begin
+  NEW.name_normalized = lower(regexp_replace(normalize(replace(replace(coalesce(NEW.service_name, ''), E'\u00a0', ' '), E'\u200b', ''), NFKD), '[^\u0001-\u007f]', '', 'g'));
+  NEW.icon = case
+    when NEW.name_normalized like '%no refill%' then '🚫'
+    when NEW.name_normalized ~ '(refill|lifetime|guaranteed|auto)' then '♻️'
+    else '⚡' end;
+  return NEW;
+end $$;
+
+drop trigger if exists classify_service on services;
+create trigger classify_service before insert or update of service_name on services
+for each row execute function classify_service();
+
+-- Backfill: fire the trigger once for existing rows
+update services set service_name = service_name where icon is null;
+
+create index if not exists services_category_keyset on services (category, id);
@@ -0,0 +1,4 @@
+-- ➕ /add skips service_ids that already exist (app-level check) and inserts the rest.
+-- A unique index on services.service_id was tried here and dropped: existing catalogs can
+-- hold duplicate service_ids, and /swap may legitimately point two rows at one supplier id.
+drop index if exists services_service_id_key;
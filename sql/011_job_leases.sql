@@ -0,0 +1,45 @@
+-- 👑 Leases for multi-replica runs: singleton jobs ("job-<name>"), order/status shards
+-- ("<prefix>-shard-<n>") and replica heartbeats ("replica-<n>"). Expiry uses the DB clock.
+
+create table if not exists job_leases (
+  name text primary key,
+  holder text not null,
+  expires_at timestamptz not null
+);
+
+-- Take or renew: succeeds if free, expired, or already ours
+create or replace function acquire_job_lease(p_name text, p_holder text, p_ttl_seconds int)
+returns boolean language plpgsql as $$
+begin
+  insert into job_leases as l (name, holder, expires_at)
+  values (p_name, p_holder, now() + make_interval(secs => p_ttl_seconds))
+  on conflict (name) do update set holder = excluded.holder, expires_at = excluded.expires_at
+   where l.holder = excluded.holder or l.expires_at < now();
+  return found;
+end $$;
+
+create or replace function release_job_lease(p_name text, p_holder text)
+returns void language sql as $$
+  delete from job_leases where name = p_name and holder = p_holder;
+$$;
+
+create or replace function job_lease_alive(p_name text)
+returns boolean language sql stable as $$
+  select exists (select 1 from job_leases where name = p_name and expires_at > now());
+$$;
+
+-- Orders are sharded by shard_bucket = id % 1024 (set by trigger so whole-row upserts can't break it)
+alter table "WebsiteOrders" add column if not exists shard_bucket smallint;
+
+create or replace function set_shard_bucket() returns trigger
+language plpgsql as $$
+begin
+  NEW.shard_bucket = (NEW.id % 1024)::smallint;
+  return NEW;
+end $$;
+
+drop trigger if exists set_shard_bucket on "WebsiteOrders";
+create trigger set_shard_bucket before insert or update on "WebsiteOrders" for each row execute function set_shard_bucket();
+
+update "WebsiteOrders" set shard_bucket = (id % 1024)::smallint where shard_bucket is null;
+create index if not exists websiteorders_shard on "WebsiteOrders" (shard_bucket, id);
@@ -0,0 +1,14 @@
+-- ⏱️ Status poller writes: one call per batch that sets only status / remain / refund_amount,
+-- so columns edited meanwhile by the website or admin commands are left alone. A row with
+-- old_status only changes while it still has that status (an admin /Error or /Done in between
+-- wins), and only the returned ids get their refund / sale / reward side effects.
+create or replace function apply_order_status(p_rows jsonb)
+returns table(id bigint) language sql as $$
+  update "WebsiteOrders" o
+     set status = r.status,
+         remain = coalesce(r.remain, o.remain),
+         refund_amount = coalesce(r.refund_amount, o.refund_amount)
+    from jsonb_to_recordset(p_rows) as r(id bigint, old_status text, status text, remain integer, refund_amount numeric)
+   where o.id = r.id and (r.old_status is null or o.status = r.old_status)
+  returning o.id
+$$;
@@ -0,0 +1,15 @@
+-- 💵 Rate sync and /reprice write prices only: one call per chunk that sets buy_price /
+-- sell_price (null = keep), so total_sold_qty (rollup_sales_events), channel_msg_id and
+-- /Change edits made meanwhile are never overwritten from a catalog snapshot.
+create or replace function update_service_prices(p_rows jsonb)
+returns int language sql as $$
+  with u as (
+    update services s
+       set buy_price = coalesce(r.buy_price, s.buy_price),
+           sell_price = coalesce(r.sell_price, s.sell_price)
+      from jsonb_to_recordset(p_rows) as r(id bigint, buy_price numeric, sell_price numeric)
+     where s.id = r.id
+    returning 1
+  )
+  select count(*)::int from u
+$$;
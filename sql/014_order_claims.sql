@@ -0,0 +1,7 @@
+-- 📒 The submission journal is a file on the replica that claimed the order, so the row
+-- records who that was. Startup only releases orphan claims it can check against its own
+-- journal, and /Resend (handled by whichever replica polls Telegram) leaves a flag the
+-- claiming replica honours instead of writing to a journal it can't see.
+alter table "WebsiteOrders" add column if not exists claimed_by smallint;        -- REPLICA_INDEX of the claimer
+alter table "WebsiteOrders" add column if not exists resend_ok boolean not null default false;
+create index if not exists websiteorders_submitting on "WebsiteOrders" (claimed_by) where status = 'Submitting';
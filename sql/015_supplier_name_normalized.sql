@@ -0,0 +1,19 @@
+-- 🏷️ Order claiming matches supplier_name exactly (in_('smmgen','k2boost')); the old loop
+-- compared lower(strip()). Store it normalized so "SMMGen" / "smmgen " rows are claimed too.
+create or replace function normalize_supplier_name() returns trigger
+language plpgsql as $$
+begin
+  NEW.supplier_name = lower(btrim(NEW.supplier_name));
+  return NEW;
+end $$;
+
+drop trigger if exists normalize_supplier_name on "WebsiteOrders";
+create trigger normalize_supplier_name before insert or update of supplier_name on "WebsiteOrders"
+  for each row execute function normalize_supplier_name();
+
+update "WebsiteOrders" set supplier_name = lower(btrim(supplier_name))
+ where supplier_name is distinct from lower(btrim(supplier_name));
+
+alter table "WebsiteOrders" drop constraint if exists websiteorders_supplier_name_normalized;
+alter table "WebsiteOrders" add constraint websiteorders_supplier_name_normalized
+  check (supplier_name = lower(btrim(supplier_name)));
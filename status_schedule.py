@@ -0,0 +1,118 @@
+import heapq
+import random
+import threading
+import time
+from datetime import datetime
+
+# ⏱️ ADAPTIVE STATUS POLLING
+# Each open SMMGen order gets its own next-check time based on its age, its last
+# supplier status and how fast `remains` is dropping. Due orders are handed out in
+# lists that the status loop packs into 100-id `status` calls.
+
+MIN_INTERVAL = 60
+MAX_INTERVAL = 6 * 3600
+PACK_AHEAD = 300          # orders due within this many seconds may ride along in a half-empty batch
+AGE_STEPS = [(600, 60), (3600, 180), (6 * 3600, 600), (86400, 1800), (3 * 86400, 3600)]
+STATUS_FACTOR = {"pending": 1.0, "processing": 1.0, "in progress": 1.0, "partial": 0.5}
+
+def _parse_ts(value):
+    if not value: return None
+    try: return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+    except ValueError: return None
+
+class StatusPollScheduler:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._heap = []
+        self._entries = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def track(self, order, now=None):
+        now = now or time.time()
+        sup_id = str(order.get("supplier_order_id") or "")
+        if not sup_id.isdigit() or sup_id == "0": return
+        with self._lock:
+            e = self._entries.get(sup_id)
+            if e:
+                e["order"] = order
+                if not e["queued"]: self._push(e, sup_id, now)  # popped by due() but never rescheduled
+                return
+            created = _parse_ts(order.get("created_at")) or now
+            e = {"order": order, "created": created, "status": (order.get("status") or "").lower(),
+                 "remain": order.get("remain"), "checked": None, "stalls": 0, "next": now, "ver": 0, "queued": False}
+            self._entries[sup_id] = e
+            self._push(e, sup_id, now)
+
+    def _push(self, e, sup_id, at):
+        e["next"] = at; e["queued"] = True
+        heapq.heappush(self._heap, (at, e["ver"], sup_id))
+
+    def forget(self, sup_id):
+        with self._lock:
+            self._entries.pop(str(sup_id), None)
+
+    def known(self):
+        with self._lock:
+            return set(self._entries)
+
+    def order(self, sup_id):
+        e = self._entries.get(str(sup_id))
+        return e["order"] if e else None
+
+    def due(self, now=None, batch=100):
+        # Pop every due order, then top up the last batch with orders due soon
+        now = now or time.time()
+        out = []
+        with self._lock:
+            while self._heap:
+                at, ver, sup_id = self._heap[0]
+                e = self._entries.get(sup_id)
+                if not e or e["ver"] != ver:
+                    heapq.heappop(self._heap); continue
+                if at > now and (not out or len(out) % batch == 0 or at > now + PACK_AHEAD): break
+                heapq.heappop(self._heap)
+                e["ver"] += 1  # invalidates the popped heap slot until observe() reschedules
+                e["queued"] = False
+                out.append(sup_id)
+        return out
+
+    def observe(self, sup_id, status=None, remains=None, now=None):
+        now = now or time.time()
+        with self._lock:
+            e = self._entries.get(str(sup_id))
+            if not e: return
+            interval = self._interval(e, (status or e["status"]).lower(), remains, now)
+            if status: e["status"] = status.lower()
+            if remains is not None: e["remain"] = remains
+            e["checked"] = now
+            self._push(e, str(sup_id), now + interval)
+
+    def requeue(self, sup_ids, now=None):
+        # Popped ids nobody observed (the batch failed): back on the heap, backed off like a stalled order
+        for sup_id in sup_ids:
+            e = self._entries.get(str(sup_id))
+            if e and not e["queued"]: self.observe(sup_id, now=now)
+
+    def _interval(self, e, status, remains, now):
+        age = now - e["created"]
+        base = next((step for limit, step in AGE_STEPS if age < limit), MAX_INTERVAL)
+        base *= STATUS_FACTOR.get(status, 1.0)
+
+        prev = e["remain"]
+        if status != e["status"]:
+            e["stalls"] = 0
+        elif e["checked"] and remains is not None and prev is not None and int(prev) > int(remains) > 0:
+            # Moving: check again around when it should be half-way to done
+            rate = (int(prev) - int(remains)) / max(1.0, now - e["checked"])
+            base = min(base, (int(remains) / rate) / 2)
+            e["stalls"] = 0
+        else:
+            e["stalls"] = min(e["stalls"] + 1, 6)
+            base *= 1.5 ** e["stalls"]
+
+        base = max(MIN_INTERVAL, min(MAX_INTERVAL, base))
+        return base * random.uniform(0.9, 1.1)
+
+status_scheduler = StatusPollScheduler()
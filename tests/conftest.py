@@ -0,0 +1,10 @@
+import os
+import sys
+
+# Modules are flat at the repo root and build their clients at import time: point them at
+# dummy settings and keep the in-process stand-ins (LocalChangeFeed, LocalLeases)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("SUPABASE_URL", "http://localhost.invalid")
+os.environ.setdefault("SUPABASE_KEY", "test")
+os.environ.pop("DATABASE_URL", None)
+os.environ.pop("REPLICA_COUNT", None)
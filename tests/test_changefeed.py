@@ -0,0 +1,45 @@
+import asyncio
+import json
+from changefeed import LocalChangeFeed, change_feed
+from scheduler import JobScheduler
+
+def test_notify_reaches_table_subscribers():
+    feed = LocalChangeFeed(); seen = []
+    feed.subscribe("WebsiteOrders", lambda row: seen.append(("orders", row)))
+    feed.subscribe("transactions", lambda row: seen.append(("tx", row)))
+    feed.notify(json.dumps({"table": "WebsiteOrders", "id": 7}))
+    assert seen == [("orders", {"table": "WebsiteOrders", "id": 7})]
+
+def test_failing_handler_does_not_block_others():
+    feed = LocalChangeFeed(); seen = []
+    feed.subscribe("SupportBox", lambda row: 1 / 0)
+    feed.subscribe("SupportBox", lambda row: seen.append(row))
+    feed.poke("SupportBox", {"id": 1})
+    assert seen == [{"id": 1}]
+
+def test_wake_all_pokes_every_subscribed_table():
+    feed = LocalChangeFeed(); seen = []
+    for t in ("a", "b"): feed.subscribe(t, lambda row, t=t: seen.append(t))
+    feed.wake_all()
+    assert sorted(seen) == ["a", "b"]
+
+def test_feed_event_wakes_scheduled_job():
+    runs = []
+
+    async def scenario():
+        sched = JobScheduler()
+        sched.add("orders", lambda: runs.append(1), 60, jitter=0, triggers=["WebsiteOrders"])
+        await sched.start()
+        try:
+            await asyncio.sleep(0.2)
+            assert len(runs) == 1  # first run, then a 60s sleep
+            change_feed.notify({"table": "WebsiteOrders", "id": 1})
+            await asyncio.sleep(0.2)
+            assert len(runs) == 2  # woken early by the feed
+            change_feed.notify({"table": "transactions", "id": 1})
+            await asyncio.sleep(0.2)
+            assert len(runs) == 2  # other tables don't wake it
+        finally:
+            await sched.stop()
+
+    asyncio.run(scenario())
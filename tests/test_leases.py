@@ -0,0 +1,126 @@
+import asyncio
+import time
+import config
+import scheduler as scheduler_mod
+from leases import LocalLeases, ShardOwnership, shard_of, shard_buckets, SHARD_BUCKETS
+
+def replicas(*holders):
+    # Several "replicas" sharing one in-process lease table
+    first = LocalLeases(holders[0]); out = [first]
+    for h in holders[1:]:
+        r = LocalLeases(h); r._leases, r._lock = first._leases, first._lock
+        out.append(r)
+    return out
+
+def settle(*owners):
+    # Whoever starts first adopts the others' shards until they heartbeat; give it a few refreshes
+    for _ in range(3):
+        for o in owners: o.owned()
+        time.sleep(owners[0].ttl / 3 + 0.05)
+
+class FakeQuery:
+    def __init__(self): self.filters = []
+    def in_(self, col, vals): self.filters.append((col, list(vals))); return self
+
+def test_lease_is_exclusive_until_it_expires():
+    a, b = replicas("a", "b")
+    assert a.acquire("job-x", 0.2)
+    assert not b.acquire("job-x", 0.2)
+    assert a.alive("job-x")
+    time.sleep(0.25)
+    assert not a.alive("job-x")
+    assert b.acquire("job-x", 0.2)
+    assert not a.acquire("job-x", 0.2)
+
+def test_renewal_extends_and_release_is_holder_only():
+    a, b = replicas("a", "b")
+    a.acquire("job-x", 0.2)
+    time.sleep(0.15); assert a.acquire("job-x", 0.2)  # renewed by the holder
+    time.sleep(0.15); assert not b.acquire("job-x", 0.2)
+    b.release("job-x"); assert a.alive("job-x")
+    a.release("job-x"); assert b.acquire("job-x", 0.2)
+
+def test_shard_math_is_consistent():
+    buckets = shard_buckets([1], 3)
+    assert all(b % 3 == 1 for b in buckets) and len(buckets) == len(range(1, SHARD_BUCKETS, 3))
+    for oid in (1, 1024, 1025, 99999):
+        assert (shard_of(oid, 3) == 1) == ((oid % SHARD_BUCKETS) in buckets)
+
+def test_single_replica_owns_everything():
+    own = ShardOwnership("orders", LocalLeases("solo"), index=0, count=1)
+    q = FakeQuery()
+    assert own.owned() == [0] and own.owns(12345)
+    assert own.filter(q) is q and q.filters == []
+
+def test_shards_fail_over_and_hand_back():
+    ttl = 0.3
+    a, b = replicas("a", "b")
+    ra = ShardOwnership("orders", a, index=0, count=2, ttl=ttl)
+    rb = ShardOwnership("orders", b, index=1, count=2, ttl=ttl)
+    settle(ra, rb)
+    assert ra.owned() == [0] and rb.owned() == [1]
+    assert ra.filter(FakeQuery()).filters == [("shard_bucket", shard_buckets([0], 2))]
+
+    rb.release_all()  # replica 1 stops
+    time.sleep(ttl / 3 + 0.05)
+    assert ra.owned() == [0, 1]  # adopted at once: the heartbeat was released too
+    assert ra.owns(3)
+
+    rb2 = ShardOwnership("orders", b, index=1, count=2, ttl=ttl)
+    assert rb2.owned() == [] and rb2.filter(FakeQuery()) is None  # still held by replica 0
+    time.sleep(ttl / 3 + 0.05)
+    assert ra.owned() == [0]  # replica 1 heartbeats again -> handed back
+    time.sleep(ttl / 3 + 0.05)
+    assert rb2.owned() == [1]
+
+def test_dead_owner_shard_is_adopted_after_ttl():
+    ttl = 0.3
+    a, b = replicas("a", "b")
+    ra = ShardOwnership("status", a, index=0, count=2, ttl=ttl)
+    rb = ShardOwnership("status", b, index=1, count=2, ttl=ttl)
+    settle(ra, rb)
+    assert ra.owned() == [0]
+    time.sleep(ttl + 0.05)  # replica 1 crashed: no release, its leases just expire
+    assert ra.owned() == [0, 1]
+
+def test_scheduler_keeps_singleton_lease_across_long_sleeps(monkeypatch):
+    a, b = replicas("a", "b")
+    monkeypatch.setattr(config, "LEASE_TTL", 0.3)
+    monkeypatch.setattr(scheduler_mod, "leases", a)
+    runs = []
+
+    async def scenario():
+        sched = scheduler_mod.JobScheduler()
+        sched.add("rates", lambda: runs.append(1), 1.0, jitter=0, singleton=True)
+        await sched.start()
+        try:
+            await asyncio.sleep(1.3)  # job sleeps 1s, far past the 0.3s TTL
+            assert len(runs) == 2
+            assert not b.acquire("job-rates", 1)  # the heartbeat kept it renewed
+        finally:
+            await sched.stop()
+        assert b.acquire("job-rates", 1)  # released on stop
+
+    asyncio.run(scenario())
+
+def test_standby_replica_skips_singleton_runs(monkeypatch):
+    a, b = replicas("a", "b")
+    monkeypatch.setattr(config, "LEASE_TTL", 5)
+    monkeypatch.setattr(scheduler_mod, "leases", a)
+    assert b.acquire("job-rates", 5)
+    runs = []
+
+    async def scenario():
+        sched = scheduler_mod.JobScheduler()
+        sched.add("rates", lambda: runs.append(1), 0.1, jitter=0, singleton=True)
+        await sched.start()
+        try:
+            await asyncio.sleep(0.35)
+            assert runs == [] and sched.status()["rates"]["leader"] is False
+            b.release("job-rates")
+            await asyncio.sleep(0.3)
+            assert runs and sched.status()["rates"]["leader"] is True
+        finally:
+            await sched.stop()
+
+    asyncio.run(scenario())
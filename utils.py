@@ -1,6 +1,8 @@
 import config
+import csv
 import html
 import re
+import unicodedata
 
 TEXTS = {
     'en': {
@@ -59,10 +61,79 @@ def calculate_cost(quantity, service_data):
     cost = (sell_price / per_qty) * quantity
     return round(cost, 6)
 
-def calculate_sell_price(buy_price, service_name):
-    if 'view' in service_name.lower():
-        return round(buy_price * 3.0, 4)
-    return round(buy_price * 1.4, 4)
+def build_order_row(email, svc, qty, link, cost, comments=None):
+    per_qty = int(svc.get('per_quantity', 1000))
+    if per_qty < 1: per_qty = 1000
+    buy_charge = (float(svc.get('buy_price', 0)) / per_qty) * qty
+    row = {
+        "email": email,
+        "service": svc['service_name'],
+        "service_local_id": svc.get('id'),
+        "quantity": qty,
+        "link": link,
+        "day": 1,
+        "remain": qty,
+        "start_count": 0,
+        "buy_charge": round(buy_charge, 6),
+        "sell_charge": round(cost, 6),
+        "supplier_service_id": svc['service_id'],
+        "supplier_name": svc['source'],
+        "status": "Pending",
+        "UsedType": svc['use_type'],
+        "supplier_order_id": 0
+    }
+    if comments: row['comments'] = comments
+    return row
+
+# 📄 Mass order line parser (works on any line iterator, e.g. a streamed upload)
+def parse_mass_lines(lines, header=False):
+    for n, raw in enumerate(lines, 1):
+        line = raw.strip()
+        if not line or line.startswith('#'): continue
+        p = line.replace('|', ' ').split()
+        if len(p) != 3 and (',' in line or ';' in line):
+            p = [x.strip() for x in next(csv.reader([line.replace(';', ',')]))]
+        if len(p) != 3:
+            yield n, None, None, None, "expected: ID Link Qty"
+            continue
+        if header and n == 1 and not p[0].isdigit(): continue  # uploaded CSV header row
+        if not p[0].isdigit():
+            yield n, None, None, None, f"bad service ID '{p[0]}'"
+            continue
+        try: qty = int(p[2])
+        except ValueError:
+            yield n, None, None, None, f"bad quantity '{p[2]}'"
+            continue
+        yield n, p[0], p[1], qty, None
+
+# 📑 Split text blocks into pages that stay under Telegram's message limit
+def paginate_blocks(blocks, limit=3500):
+    pages = []; cur = ""
+    for b in blocks:
+        for piece in ([b] if len(b) <= limit else _split_block(b, limit)):
+            if cur and len(cur) + len(piece) > limit:
+                pages.append(cur); cur = ""
+            cur += piece
+    if cur: pages.append(cur)
+    return pages
+
+def _split_block(b, limit):
+    # Oversized block (e.g. a very long link): split on lines, which keeps per-line tags
+    # balanced, and hard-cut longer lines without breaking an HTML entity
+    for line in b.splitlines(True):
+        while len(line) > limit:
+            cut = limit; amp = line.rfind('&', 0, cut)
+            if amp > 0 and line.find(';', amp, cut) == -1: cut = amp
+            yield line[:cut]; line = line[cut:]
+        if line: yield line
+
+# 🖼️ Channel icon + normalized name (stored on services at write time, see sql/009)
+def classify_service(name):
+    normalized = unicodedata.normalize('NFKD', (name or "").replace('\xa0', ' ').replace('\u200b', '')).encode('ascii', 'ignore').decode('utf-8').lower()
+    if "no refill" in normalized: icon = "🚫"
+    elif any(x in normalized for x in ["refill", "lifetime", "guaranteed", "auto"]): icon = "♻️"
+    else: icon = "⚡"
+    return icon, normalized
 
 # 🧹 Name Cleaner Helper
 def clean_service_name(raw_name):
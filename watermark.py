@@ -0,0 +1,52 @@
+import time
+from datetime import datetime, timedelta
+import config
+from db import supabase
+
+# 🔖 KEYSET WATERMARKS (see sql/002_poller_watermarks.sql)
+# A poller only reads rows whose (updated_at, id) is past its persisted watermark, so
+# each cycle costs work proportional to new rows. A short overlap re-reads rows whose
+# transaction committed late, and a periodic sweep from epoch picks up anything a
+# failed cycle skipped; both are harmless because pollers still filter on status.
+EPOCH = "1970-01-01T00:00:00+00:00"
+
+def _shift(ts, seconds):
+    try: return (datetime.fromisoformat(ts.replace("Z", "+00:00")) - timedelta(seconds=seconds)).isoformat()
+    except ValueError: return EPOCH
+
+class Watermark:
+    def __init__(self, name, page=500):
+        self.name = name
+        self.page = page
+        self.ts, self.last_id = EPOCH, 0
+        self._loaded = False
+        self._last_sweep = time.monotonic()
+
+    def _load(self):
+        row = supabase.table("poller_watermarks").select("*").eq("name", self.name).execute().data
+        if row: self.ts, self.last_id = row[0]["updated_at"], int(row[0]["last_id"])
+        self._loaded = True
+
+    def _save(self, ts, last_id):
+        if (ts, last_id) <= (self.ts, self.last_id): return
+        supabase.table("poller_watermarks").upsert({"name": self.name, "updated_at": ts, "last_id": last_id}).execute()
+        self.ts, self.last_id = ts, last_id
+
+    def rows(self, make_query):
+        for page in self.pages(make_query): yield from page
+
+    def pages(self, make_query):
+        # Yields new rows page by page; the watermark moves past a page once the caller is done with it
+        if not self._loaded: self._load()
+        if time.monotonic() - self._last_sweep > config.WATERMARK_SWEEP_INTERVAL:
+            cur_ts, cur_id = EPOCH, 0
+            self._last_sweep = time.monotonic()
+        else:
+            cur_ts, cur_id = _shift(self.ts, config.WATERMARK_OVERLAP), 0
+        while True:
+            page = make_query().or_(f'updated_at.gt."{cur_ts}",and(updated_at.eq."{cur_ts}",id.gt.{cur_id})').order("updated_at").order("id").limit(self.page).execute().data or []
+            if not page: return
+            yield page
+            cur_ts, cur_id = page[-1]["updated_at"], int(page[-1]["id"])
+            self._save(cur_ts, cur_id)
+            if len(page) < self.page: return